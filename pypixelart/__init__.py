@@ -1 +1,11 @@
-from pypixelart.py_pixel_art import PyPixelArt
+def __getattr__(name):
+    """
+    Import PyPixelArt lazily, so that importing a submodule such as pypixelart.main
+    doesn't pull in pygame before it's needed
+    """
+    if name == "PyPixelArt":
+        from pypixelart.py_pixel_art import PyPixelArt
+
+        return PyPixelArt
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,204 @@
+import collections
+import logging
+import operator
+import pathlib
+from array import array
+from typing import Dict, List
+
+import pygame as pg
+
+
+def pack_color(color: pg.Color) -> int:
+    """
+    Return color as the int its RGBA bytes form in the arrays used by ImageStats
+    """
+    return array("I", bytes(tuple(color)))[0]
+
+
+def unpack_color(key: int) -> pg.Color:
+    return pg.Color(*array("I", [key]).tobytes())
+
+
+def pixel_array(image: pg.Surface, rect: pg.Rect = None) -> array:
+    """
+    Return the pixels of image inside rect, or all of them, as an array with one int per pixel
+    """
+    surface = image if rect is None else image.subsurface(rect)
+    return array("I", pg.image.tostring(surface, "RGBA"))
+
+
+def load_reference(path: pathlib.Path) -> pg.Surface:
+    """
+    Return the image saved in path, or None if it doesn't exist, to diff the image against
+    """
+    # Imported here so that the file formats are only imported once statistics are shown
+    from pypixelart.png_stream import load_image
+    from pypixelart.project_file import ProjectFile
+
+    if not path.is_file():
+        return None
+    if path.suffix.lower() == ".ppa":
+        project = ProjectFile.open(path)
+        project.load_all()
+        return project.image
+    return load_image(path)
+
+
+class ImageStats:
+    """
+    Statistics of an image: how many pixels of each color it has, the bounding box of its
+    non-transparent pixels and how many pixels differ from a reference image, like the
+    file on disk.
+
+    Computing them scans the whole image once, converting it to an array of ints with
+    pygame and counting them with Counter, which both run in C instead of calling
+    get_at for every pixel. After that, update only scans the rect a command changed,
+    comparing it with a copy of the pixels from the previous update, so showing the
+    statistics every frame costs nothing while the image doesn't change.
+
+    The copy of the image and the one of the reference take 4 bytes per pixel each,
+    so diffing a 16384x16384 image keeps 2 GiB of arrays while the statistics exist.
+    """
+
+    def __init__(self, image: pg.Surface, reference: pg.Surface = None):
+        self.image: pg.Surface = image
+        self._pixels: array = pixel_array(image)
+        self.color_counts: collections.Counter = collections.Counter(self._pixels)
+        self._content_rect: pg.Rect = None
+        # Incremented on every change, so text made from the statistics can be cached
+        self.version: int = 0
+
+        self._reference: array = None
+        self.changed_pixels: int = 0
+        self.set_reference(reference)
+
+    @property
+    def has_reference(self) -> bool:
+        return self._reference is not None
+
+    def set_reference(self, reference: pg.Surface) -> None:
+        """
+        Diff the image against reference from now on, or against nothing if it's None or
+        doesn't have the size of the image
+        """
+        if reference is not None and reference.get_size() != self.image.get_size():
+            logging.info("Not diffing against a reference of a different size")
+            reference = None
+
+        self._reference = None if reference is None else pixel_array(reference)
+        self.changed_pixels = (
+            0
+            if reference is None
+            else sum(map(operator.ne, self._pixels, self._reference))
+        )
+        self.version += 1
+
+    def set_reference_to_image(self) -> None:
+        """
+        Diff against the image as it is now, e.g. after it's saved to disk
+        """
+        self._reference = array("I", self._pixels)
+        self.changed_pixels = 0
+        self.version += 1
+
+    def update(self, rect: pg.Rect) -> None:
+        """
+        Update the statistics after the pixels of the image inside rect changed
+        """
+        rect = rect.clip(self.image.get_rect())
+        if not rect.w or not rect.h:
+            return
+
+        width = self.image.get_width()
+        new_pixels = pixel_array(self.image, rect)
+        old_counts = collections.Counter()
+        for row in range(rect.h):
+            start = (rect.y + row) * width + rect.x
+            old_row = self._pixels[start : start + rect.w]
+            new_row = new_pixels[row * rect.w : (row + 1) * rect.w]
+            old_counts.update(old_row)
+            if self._reference is not None:
+                reference_row = self._reference[start : start + rect.w]
+                self.changed_pixels += sum(
+                    map(operator.ne, new_row, reference_row)
+                ) - sum(map(operator.ne, old_row, reference_row))
+            self._pixels[start : start + rect.w] = new_row
+
+        self.color_counts.subtract(old_counts)
+        self.color_counts.update(new_pixels)
+        for key in old_counts:
+            if self.color_counts[key] <= 0:
+                del self.color_counts[key]
+        self._content_rect = None
+        self.version += 1
+
+    @property
+    def content_rect(self) -> pg.Rect:
+        """
+        Bounding box of the pixels that aren't fully transparent
+        """
+        if self._content_rect is None:
+            self._content_rect = self.image.get_bounding_rect(min_alpha=1)
+        return self._content_rect
+
+    @property
+    def unique_colors(self) -> int:
+        """
+        Number of different colors in the image, not counting fully transparent pixels
+        """
+        return sum(1 for key in self.color_counts if unpack_color(key).a)
+
+    def palette_histogram(self, palette: Dict[str, pg.Color]) -> Dict[str, int]:
+        """
+        Return how many pixels have each color of palette, plus how many visible pixels
+        have a color that isn't in it, as "other"
+        """
+        histogram = {
+            name: self.color_counts.get(pack_color(color), 0)
+            for name, color in palette.items()
+        }
+        palette_keys = {pack_color(color) for color in palette.values()}
+        histogram["other"] = sum(
+            count
+            for key, count in self.color_counts.items()
+            if key not in palette_keys and unpack_color(key).a
+        )
+        return histogram
+
+    def to_dict(self, palette: Dict[str, pg.Color]) -> dict:
+        """
+        Return the statistics as a dict that can be serialized to JSON
+        """
+        content_rect = self.content_rect
+        stats = {
+            "size": list(self.image.get_size()),
+            "unique_colors": self.unique_colors,
+            "content_rect": list(content_rect) if content_rect.w else None,
+            "palette_histogram": self.palette_histogram(palette),
+        }
+        if self.has_reference:
+            stats["changed_pixels"] = self.changed_pixels
+        return stats
+
+    def summary_lines(self, palette: Dict[str, pg.Color]) -> List[str]:
+        """
+        Return the statistics as short lines of text to show in the editor
+        """
+        content_rect = self.content_rect
+        lines = [
+            f"Unique colors: {self.unique_colors}",
+            "Content: "
+            + (
+                f"{content_rect.w}x{content_rect.h} at {content_rect.topleft}"
+                if content_rect.w
+                else "empty"
+            ),
+        ]
+        if self.has_reference:
+            lines.append(f"Changed since saved: {self.changed_pixels}")
+        lines += [
+            f"{name}: {count}"
+            for name, count in self.palette_histogram(palette).items()
+            if count
+        ]
+        return lines
@@ -1,4 +1,6 @@
-from typing import Protocol
+from typing import List, Protocol
+
+import pygame as pg
 
 
 class Command(Protocol):
@@ -15,3 +17,16 @@ class Command(Protocol):
 
     def undo(self) -> None:
         ...
+
+    def dirty_rect(self) -> pg.Rect:
+        """
+        Rect of the image changed when the command is executed or undone
+        """
+        ...
+
+    def dirty_rects(self) -> List[pg.Rect]:
+        """
+        Rects of the image changed when the command is executed or undone, for commands
+        that change separate regions, whose bounding box could be much larger
+        """
+        return [self.dirty_rect()]
@@ -1,48 +1,250 @@
 import logging
 from dataclasses import dataclass
-from typing import Tuple
+from typing import List, Sequence, Tuple, Union
 
 import pygame as pg
 
 from pypixelart.command import Command
+from pypixelart.constants import ALPHA
+from pypixelart.shapes import Span
 from pypixelart.symmetry_type import SymmetryType
-from pypixelart.utils import draw_pixel
+from pypixelart.utils import (
+    draw_pixels,
+    draw_spans,
+    copy_region,
+    restore_region,
+)
 
 
 @dataclass
 class DrawPixelAtCursor(Command):
+    """
+    Draw a pixel at the cursor, and at its mirrored positions with symmetry
+    """
+
     image: pg.Surface
     position: Tuple[int, int]
     new_color: pg.Color
     symmetry_type: SymmetryType
-    previous_pos_and_colors: Tuple[
-        Tuple[Tuple[int, int], pg.Color], Tuple[Tuple[int, int], pg.Color]
-    ] = None
+    previous_pos_and_colors: List[Tuple[Tuple[int, int], pg.Color]] = None
 
     def execute(self) -> None:
-        previous_pos_and_color = self.position, self.image.get_at(self.position)
-        symmetric_previous_pos_and_color = draw_pixel(
-            self.image, self.position, self.new_color, self.symmetry_type
+        self.previous_pos_and_colors = draw_pixels(
+            self.image, [self.position], self.new_color, self.symmetry_type
         )
-        self.previous_pos_and_colors = (
-            previous_pos_and_color,
-            symmetric_previous_pos_and_color,
+        logging.debug("Pixel drawn at %s", self.position)
+
+    def undo(self) -> None:
+        restore_pixels(self.image, self.previous_pos_and_colors)
+        logging.debug("Undo for pixel at %s", self.position)
+
+    def redo(self) -> None:
+        self.execute()
+
+    def dirty_rect(self) -> pg.Rect:
+        return pixels_bounding_box(self.previous_pos_and_colors)
+
+    def dirty_rects(self) -> List[pg.Rect]:
+        return pixel_rects(self.previous_pos_and_colors)
+
+
+@dataclass
+class DrawPixels(Command):
+    """
+    Draw a pixel at every position, like the ones of a cursor set, as a single command
+    writing all of them with the image locked once
+    """
+
+    image: pg.Surface
+    positions: Sequence[Tuple[int, int]]
+    new_color: pg.Color
+    symmetry_type: SymmetryType
+    previous_pos_and_colors: List[Tuple[Tuple[int, int], pg.Color]] = None
+
+    def execute(self) -> None:
+        self.previous_pos_and_colors = draw_pixels(
+            self.image, self.positions, self.new_color, self.symmetry_type
         )
-        logging.debug(
-            f"Pixel drawn at position-color tuples: "
-            f"{previous_pos_and_color} and "
-            f"{symmetric_previous_pos_and_color}"
+        logging.debug("Pixels drawn at %d positions", len(self.positions))
+
+    def undo(self) -> None:
+        restore_pixels(self.image, self.previous_pos_and_colors)
+        logging.debug("Undo for pixels at %d positions", len(self.positions))
+
+    def redo(self) -> None:
+        self.execute()
+
+    def dirty_rect(self) -> pg.Rect:
+        return pixels_bounding_box(self.previous_pos_and_colors)
+
+    def dirty_rects(self) -> List[pg.Rect]:
+        return pixel_rects(self.previous_pos_and_colors)
+
+
+def restore_pixels(
+    image: pg.Surface, pos_and_colors: List[Tuple[Tuple[int, int], pg.Color]]
+) -> None:
+    image.lock()
+    try:
+        for position, color in pos_and_colors:
+            image.set_at(position, color)
+    finally:
+        image.unlock()
+
+
+def pixels_bounding_box(
+    pos_and_colors: List[Tuple[Tuple[int, int], pg.Color]],
+) -> pg.Rect:
+    rects = pixel_rects(pos_and_colors)
+    return rects[0].unionall(rects[1:])
+
+
+def pixel_rects(
+    pos_and_colors: List[Tuple[Tuple[int, int], pg.Color]],
+) -> List[pg.Rect]:
+    """
+    Return a rect for every pixel drawn, once even if it was drawn more than once
+    """
+    return [pg.Rect(position, (1, 1)) for position in dict(pos_and_colors)]
+
+
+@dataclass
+class DrawSpans(Command):
+    """
+    Draw a shape rasterized into spans as a single command. Only the bounding box
+    covered by the shape is saved to undo it.
+    """
+
+    image: pg.Surface
+    spans: List[Span]
+    new_color: pg.Color
+    symmetry_type: SymmetryType
+    previous_region: Union[None, Tuple[pg.Rect, pg.Surface]] = None
+
+    def execute(self) -> None:
+        self.previous_region = draw_spans(
+            self.image, self.spans, self.new_color, self.symmetry_type
         )
+        logging.debug("Drew %d spans", len(self.spans))
 
     def undo(self) -> None:
-        for drawn_pixel_pos_color_tuple in self.previous_pos_and_colors:
-            # Second pixel could be None when the symmetry type is NoSymmetry
-            if drawn_pixel_pos_color_tuple is not None:
-                drawn_pixel_pos, drawn_pixel_color = drawn_pixel_pos_color_tuple
-                self.image.set_at(drawn_pixel_pos, drawn_pixel_color)
-                logging.debug(
-                    f"Undo for position-color tuple {drawn_pixel_pos_color_tuple}"
-                )
+        if self.previous_region is not None:
+            bounding_box, region = self.previous_region
+            restore_region(self.image, region, bounding_box.topleft)
+            logging.debug("Undo for spans in %s", bounding_box)
 
     def redo(self) -> None:
         self.execute()
+
+    def dirty_rect(self) -> pg.Rect:
+        if self.previous_region is None:
+            return pg.Rect(0, 0, 0, 0)
+        bounding_box, _ = self.previous_region
+        return bounding_box
+
+
+@dataclass
+class BlitRegion(Command):
+    """
+    Write a surface into the image at position, replacing the pixels under it.
+    Only the destination rectangle is saved to undo it.
+    """
+
+    image: pg.Surface
+    source: pg.Surface
+    position: Tuple[int, int]
+    previous_region: Union[None, Tuple[pg.Rect, pg.Surface]] = None
+
+    def execute(self) -> None:
+        destination = self.source.get_rect(topleft=self.position).clip(
+            self.image.get_rect()
+        )
+        self.previous_region = destination, copy_region(self.image, destination)
+        restore_region(self.image, self.source, self.position)
+        logging.debug("Blitted %s at %s", self.source, self.position)
+
+    def undo(self) -> None:
+        destination, region = self.previous_region
+        restore_region(self.image, region, destination.topleft)
+        logging.debug("Undo for blit at %s", destination)
+
+    def redo(self) -> None:
+        self.execute()
+
+    def dirty_rect(self) -> pg.Rect:
+        destination, _ = self.previous_region
+        return destination
+
+
+@dataclass
+class MoveRegion(Command):
+    """
+    Move the pixels of the image inside source_rect so its top left corner is at position,
+    leaving transparent pixels behind. Only the source and destination rectangles are saved
+    to undo it, and the move itself is a single blit.
+    """
+
+    image: pg.Surface
+    source_rect: pg.Rect
+    position: Tuple[int, int]
+    previous_regions: List[Tuple[pg.Rect, pg.Surface]] = None
+
+    def execute(self) -> None:
+        image_rect = self.image.get_rect()
+        source_rect = self.source_rect.clip(image_rect)
+        destination = source_rect.move(
+            self.position[0] - source_rect.x, self.position[1] - source_rect.y
+        ).clip(image_rect)
+
+        source = copy_region(self.image, source_rect)
+        self.previous_regions = [
+            (source_rect, source),
+            (destination, copy_region(self.image, destination)),
+        ]
+        self.image.fill(ALPHA, source_rect)
+        restore_region(self.image, source, self.position)
+        logging.debug("Moved %s to %s", source_rect, self.position)
+
+    def undo(self) -> None:
+        # Both copies were taken before the move, so they agree where they overlap
+        for rect, region in self.previous_regions:
+            restore_region(self.image, region, rect.topleft)
+        logging.debug("Undo for move of %s", self.source_rect)
+
+    def redo(self) -> None:
+        self.execute()
+
+    def dirty_rect(self) -> pg.Rect:
+        (source_rect, _), (destination, _) = self.previous_regions
+        return source_rect.union(destination)
+
+    def dirty_rects(self) -> List[pg.Rect]:
+        return [rect for rect, _ in self.previous_regions]
+
+
+@dataclass
+class CommandGroup(Command):
+    """
+    Commands that are undone and redone together, like the steps of a replayed macro
+    """
+
+    commands: List[Command]
+
+    def execute(self) -> None:
+        for command in self.commands:
+            command.execute()
+
+    def undo(self) -> None:
+        for command in reversed(self.commands):
+            command.undo()
+
+    def redo(self) -> None:
+        for command in self.commands:
+            command.redo()
+
+    def dirty_rect(self) -> pg.Rect:
+        rects = [command.dirty_rect() for command in self.commands]
+        return rects[0].unionall(rects[1:])
+
+    def dirty_rects(self) -> List[pg.Rect]:
+        return [rect for command in self.commands for rect in command.dirty_rects()]
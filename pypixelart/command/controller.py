@@ -1,26 +1,79 @@
+import contextlib
 from dataclasses import dataclass, field
+from typing import Callable, Optional
 
 from pypixelart.command import Command
+from pypixelart.command.commands import CommandGroup
+from pypixelart.metrics import metrics
 
 
 @dataclass
 class CommandController:
     undo_stack: list[Command] = field(default_factory=list)
     redo_stack: list[Command] = field(default_factory=list)
+    # Called with every command that is executed, undone or redone, after it changes the image
+    listeners: list[Callable[[Command], None]] = field(default_factory=list)
+    # Called with every command before it's executed, e.g. to load the pixels it changes
+    before_execute: list[Callable[[Command], None]] = field(default_factory=list)
+    # Commands executed inside a grouped block, which become a single undo entry
+    current_group: Optional[list[Command]] = None
+    # Most undo entries kept, dropping the oldest ones first. 0 keeps all of them.
+    history_limit: int = 0
 
     def execute(self, command: Command) -> None:
-        command.execute()
-        self.redo_stack.clear()
-        self.undo_stack.append(command)
+        for hook in self.before_execute:
+            hook(command)
+        with metrics.timer("command_seconds", type=type(command).__name__):
+            command.execute()
+        if self.current_group is not None:
+            self.current_group.append(command)
+        else:
+            self.redo_stack.clear()
+            self.push_undo(command)
+        self.notify(command)
+        metrics.increment("commands_executed", type=type(command).__name__)
 
     def undo(self) -> None:
         if self.undo_stack:
             command = self.undo_stack.pop()
             command.undo()
             self.redo_stack.append(command)
+            self.notify(command)
+            metrics.increment("commands_undone", type=type(command).__name__)
 
     def redo(self) -> None:
         if self.redo_stack:
             command = self.redo_stack.pop()
             command.redo()
-            self.undo_stack.append(command)
+            self.push_undo(command)
+            self.notify(command)
+            metrics.increment("commands_redone", type=type(command).__name__)
+
+    def push_undo(self, command: Command) -> None:
+        self.undo_stack.append(command)
+        if self.history_limit and len(self.undo_stack) > self.history_limit:
+            del self.undo_stack[0]
+
+    def notify(self, command: Command) -> None:
+        for listener in self.listeners:
+            listener(command)
+
+    @contextlib.contextmanager
+    def grouped(self):
+        """
+        Execute every command inside the with block as usual, but add them to the
+        undo stack as a single CommandGroup when the block ends
+        """
+        if self.current_group is not None:
+            # Nested groups are merged into the outer one
+            yield
+            return
+
+        self.current_group = []
+        try:
+            yield
+        finally:
+            commands, self.current_group = self.current_group, None
+            if commands:
+                self.redo_stack.clear()
+                self.push_undo(CommandGroup(commands))
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import logging
+import pathlib
+import pickle
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pygame as pg
+
+try:
+    import tomllib
+except ImportError:
+    # Python older than 3.11, where the tomli package it was based on is installed
+    # instead, and only JSON configs can be read if it's missing
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+from pypixelart.keybinding import KeyBinding
+
+# Bumped when the compiled form changes, so old cache files are ignored
+CONFIG_CACHE_VERSION = 1
+
+# Projects store up to this many palette colors
+MAX_PALETTE_COLORS = 256
+
+CONFIG_SECTIONS = {"bindings", "palette", "performance"}
+PALETTE_KEYS = {"file", "colors"}
+PERFORMANCE_KEYS = {"fps", "zoom_cache_size", "history_limit"}
+
+Rgba = Tuple[int, int, int, int]
+
+
+class ConfigError(Exception):
+    """
+    The config file, or a palette file it imports, is invalid
+    """
+
+
+@dataclass
+class Config:
+    """
+    User settings, compiled from a TOML or JSON file like:
+
+        [bindings]
+        Draw = "shift+d"    # the group of a binding, as shown in the help menu
+        "shift+w" = "shift+e" # or its default key, for groups with several bindings
+
+        [palette]
+        file = "pico-8.gpl" # a GIMP .gpl palette or a .hex palette, relative to the config
+        colors = { skin = "#f5c6a5", shadow = [40, 20, 30, 255] }
+
+        [performance]
+        fps = 60
+        zoom_cache_size = 4 # scaled images of the zoom levels kept in memory
+        history_limit = 500 # undo steps kept, 0 keeps all of them
+    """
+
+    # Binding group or default key name to the keycode and shift of the new key
+    bindings: Dict[str, Tuple[int, bool]] = field(default_factory=dict)
+    # None keeps the default palette
+    palette: Optional[List[Tuple[str, Rgba]]] = None
+    fps: int = 60
+    zoom_cache_size: int = 4
+    history_limit: int = 0
+
+    def palette_colors(self, default: Dict[str, pg.Color]) -> Dict[str, pg.Color]:
+        if self.palette is None:
+            return dict(default)
+        return {name: pg.Color(*rgba) for name, rgba in self.palette}
+
+
+def load_config(path: pathlib.Path, cache_dir: pathlib.Path = None) -> Config:
+    """
+    Return the config compiled from the file in path, reusing the compiled form stored in
+    cache_dir if neither the file nor the palette file it imports changed since.
+    Raise ConfigError if the file is invalid.
+    """
+    cache_path = None
+    if cache_dir is not None:
+        digest = hashlib.sha1(str(path.resolve()).encode()).hexdigest()[:16]
+        cache_path = cache_dir / f"config-{digest}.pickle"
+        config = read_cache(cache_path)
+        if config is not None:
+            logging.info("Loaded compiled config for %s from %s", path, cache_path)
+            return config
+
+    config, sources = compile_config(path)
+
+    if cache_path is not None:
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(cache_path, "wb") as file:
+                pickle.dump(
+                    (CONFIG_CACHE_VERSION, [source_stamp(s) for s in sources], config),
+                    file,
+                )
+        except OSError as e:
+            logging.info("Couldn't write the config cache %s: %s", cache_path, e)
+    return config
+
+
+def source_stamp(path: pathlib.Path) -> Tuple[str, int, int]:
+    stat = path.stat()
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+def read_cache(cache_path: pathlib.Path) -> Optional[Config]:
+    """
+    Return the config in cache_path, or None if there isn't one or any of the files it
+    was compiled from changed
+    """
+    try:
+        with open(cache_path, "rb") as file:
+            version, stamps, config = pickle.load(file)
+        if version != CONFIG_CACHE_VERSION:
+            return None
+        for path, mtime_ns, size in stamps:
+            if source_stamp(pathlib.Path(path)) != (path, mtime_ns, size):
+                return None
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        return None
+    return config
+
+
+def compile_config(path: pathlib.Path) -> Tuple[Config, List[pathlib.Path]]:
+    """
+    Parse and validate the config file in path.
+    Return the config and every file it was read from.
+    """
+    data = parse_file(path)
+    sources = [path]
+    unknown = set(data) - CONFIG_SECTIONS
+    if unknown:
+        raise ConfigError(f"{path}: unknown sections {', '.join(sorted(unknown))}")
+
+    config = Config()
+
+    bindings = section(data, "bindings", path)
+    for target, key in bindings.items():
+        if not isinstance(key, str):
+            raise ConfigError(f"{path}: key for {target!r} must be a string")
+        config.bindings[target] = parse_key(key, path)
+
+    palette = section(data, "palette", path)
+    unknown = set(palette) - PALETTE_KEYS
+    if unknown:
+        raise ConfigError(f"{path}: unknown palette keys {', '.join(sorted(unknown))}")
+    if palette:
+        colors: List[Tuple[str, Rgba]] = []
+        if "file" in palette:
+            if not isinstance(palette["file"], str):
+                raise ConfigError(f"{path}: the palette file must be a path")
+            palette_path = path.parent / palette["file"]
+            colors += read_palette_file(palette_path)
+            sources.append(palette_path)
+        extra_colors = palette.get("colors", {})
+        if not isinstance(extra_colors, dict):
+            raise ConfigError(f"{path}: palette colors must be a table of names")
+        colors += [
+            (name, parse_color(color, path)) for name, color in extra_colors.items()
+        ]
+        config.palette = unique_names(colors)
+        if not config.palette:
+            raise ConfigError(f"{path}: the palette has no colors")
+        if len(config.palette) > MAX_PALETTE_COLORS:
+            raise ConfigError(
+                f"{path}: palettes can have at most {MAX_PALETTE_COLORS} colors"
+            )
+
+    performance = section(data, "performance", path)
+    unknown = set(performance) - PERFORMANCE_KEYS
+    if unknown:
+        raise ConfigError(
+            f"{path}: unknown performance settings {', '.join(sorted(unknown))}"
+        )
+    for name, minimum in (("fps", 1), ("zoom_cache_size", 1), ("history_limit", 0)):
+        if name in performance:
+            value = performance[name]
+            if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+                raise ConfigError(f"{path}: {name} must be an integer >= {minimum}")
+            setattr(config, name, value)
+
+    logging.info("Compiled config %s", path)
+    return config, sources
+
+
+def parse_file(path: pathlib.Path) -> dict:
+    try:
+        if path.suffix.lower() == ".toml":
+            if tomllib is None:
+                raise ConfigError(
+                    f"{path}: TOML configs need Python 3.11 or tomli, use JSON"
+                )
+            with open(path, "rb") as file:
+                data = tomllib.load(file)
+        else:
+            with open(path, "rb") as file:
+                data = json.load(file)
+    except OSError as e:
+        raise ConfigError(f"{path}: {e.strerror}") from e
+    except ValueError as e:
+        # Both TOMLDecodeError and json.JSONDecodeError are ValueErrors
+        raise ConfigError(f"{path}: {e}") from e
+
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path}: the config must be a table")
+    return data
+
+
+def section(data: dict, name: str, path: pathlib.Path) -> dict:
+    value = data.get(name, {})
+    if not isinstance(value, dict):
+        raise ConfigError(f"{path}: {name} must be a table")
+    return value
+
+
+def parse_key(key: str, path: pathlib.Path) -> Tuple[int, bool]:
+    """
+    Return the keycode and shift of a key named like in the help menu, e.g. "shift+w"
+    """
+    modifier, _, key_name = key.rpartition("+")
+    if modifier not in ("", "shift"):
+        raise ConfigError(f"{path}: only shift can modify keys, not {modifier!r}")
+    try:
+        return pg.key.key_code(key_name), modifier == "shift"
+    except ValueError as e:
+        raise ConfigError(f"{path}: unknown key {key_name!r}") from e
+
+
+def parse_color(color, path: pathlib.Path) -> Rgba:
+    """
+    Return the RGBA values of a "#rrggbb" or "#rrggbbaa" string or a list of 3 or 4 ints
+    """
+    if isinstance(color, str) and re.fullmatch(
+        r"#?([0-9a-fA-F]{6}|[0-9a-fA-F]{8})", color
+    ):
+        hex_digits = color.lstrip("#")
+        rgba = tuple(
+            int(hex_digits[i : i + 2], 16) for i in range(0, len(hex_digits), 2)
+        )
+        return rgba + (255,) * (4 - len(rgba))
+    if (
+        isinstance(color, list)
+        and len(color) in (3, 4)
+        and all(isinstance(c, int) and 0 <= c <= 255 for c in color)
+    ):
+        return tuple(color) + (255,) * (4 - len(color))
+    raise ConfigError(f"{path}: invalid color {color!r}")
+
+
+def read_palette_file(path: pathlib.Path) -> List[Tuple[str, Rgba]]:
+    """
+    Return the named colors of a GIMP .gpl palette, or of a .hex palette with a hex color
+    per line, which are named by their hex value
+    """
+    try:
+        lines = path.read_text().splitlines()
+    except OSError as e:
+        raise ConfigError(f"{path}: {e.strerror}") from e
+
+    colors = []
+    if path.suffix.lower() == ".gpl":
+        if not lines or lines[0].strip() != "GIMP Palette":
+            raise ConfigError(f"{path}: not a GIMP palette")
+        for line_number, line in enumerate(lines[1:], start=2):
+            line = line.strip()
+            if not line or line.startswith("#") or re.match(r"\w+:", line):
+                continue
+            values = line.split(maxsplit=3)
+            try:
+                rgb = [int(v) for v in values[:3]]
+            except ValueError as e:
+                raise ConfigError(f"{path}:{line_number}: invalid color") from e
+            name = values[3] if len(values) > 3 else f"color {len(colors) + 1}"
+            colors.append((name, parse_color(rgb, path)))
+    elif path.suffix.lower() == ".hex":
+        for line in lines:
+            if line.strip():
+                colors.append((f"#{line.strip().lower()}", parse_color(line, path)))
+    else:
+        raise ConfigError(f"{path}: palettes must be .gpl or .hex files")
+    return colors
+
+
+def unique_names(colors: Iterable[Tuple[str, Rgba]]) -> List[Tuple[str, Rgba]]:
+    """
+    Number repeated names, since colors are looked up by name. Later colors with the same
+    name as an earlier one get a suffix instead of replacing it.
+    """
+    seen = set()
+    unique = []
+    for name, rgba in colors:
+        unique_name, number = name, 2
+        while unique_name in seen:
+            unique_name, number = f"{name} {number}", number + 1
+        seen.add(unique_name)
+        unique.append((unique_name, rgba))
+    return unique
+
+
+def apply_bindings(
+    keybindings: List[KeyBinding], bindings: Dict[str, Tuple[int, bool]]
+) -> None:
+    """
+    Change the keys of keybindings to the ones in bindings, looking each one up by its
+    group or by the name of its default key. Raise ConfigError if a group has several
+    bindings or if two bindings would end up on the same key.
+    """
+    by_key_name = {binding.name: binding for binding in keybindings}
+    new_keys = {}
+    for target, key in bindings.items():
+        matching = [b for b in keybindings if b.group == target]
+        if not matching and target in by_key_name:
+            matching = [by_key_name[target]]
+        if not matching:
+            raise ConfigError(f"no keybinding named {target!r}")
+        if len(matching) > 1:
+            raise ConfigError(
+                f"{target!r} has several keybindings, use one of the keys "
+                + ", ".join(b.name for b in matching)
+            )
+        new_keys[matching[0]] = key
+
+    for binding, (keycode, shift) in new_keys.items():
+        binding.keycode, binding.shift = keycode, shift
+
+    used = {}
+    for binding in keybindings:
+        key = binding.keycode, binding.shift
+        if key in used:
+            raise ConfigError(
+                f"{binding.group} and {used[key].group} are both bound to {binding.name}"
+            )
+        used[key] = binding
@@ -7,5 +7,18 @@ GREY = pg.Color(50, 50, 50)
 LIGHTER_GREY = pg.Color(80, 80, 80)
 RED = pg.Color(255, 80, 80)
 ALPHA = pg.Color(0, 0, 0, 0)
+CURSOR_SET_COLOR = pg.Color(255, 80, 80, 120)
+
+DEFAULT_PALETTE = {
+    "red": pg.Color(172, 50, 50),
+    "cream": pg.Color(217, 160, 102),
+    "brown": pg.Color(102, 57, 49),
+    "black": pg.Color(0, 0, 0),
+    "blue": pg.Color(91, 110, 225),
+    "yellow": pg.Color(251, 242, 54),
+}
+
+# Colors shown at once in color selection, one for each digit key
+PALETTE_PAGE_SIZE = 10
 
 DEFAULT_BORDER_RADIUS = 8
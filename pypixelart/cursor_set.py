@@ -0,0 +1,86 @@
+import math
+from array import array
+from typing import List, Tuple
+
+# Grids with more cursors than this would take too long to draw with and to show
+MAX_CURSORS = 16384
+
+
+class CursorSet:
+    """
+    Extra cursors that move together with the main cursor, stored as their x and y
+    offsets from it interleaved in a single array of ints, so that stamps with
+    thousands of cursors don't need an object per cursor.
+
+    Positions wrap around the edges of the image like the main cursor does, which
+    makes a grid of cursors spaced by the size of a tile draw on every tile at once.
+    """
+
+    def __init__(self):
+        self.offsets: array = array("i")
+        # Incremented on every change, so drawings of the cursors can be cached
+        self.version: int = 0
+
+    def __len__(self) -> int:
+        return len(self.offsets) // 2
+
+    def __contains__(self, offset: Tuple[int, int]) -> bool:
+        dx, dy = offset
+        return any(
+            self.offsets[i] == dx and self.offsets[i + 1] == dy
+            for i in range(0, len(self.offsets), 2)
+        )
+
+    def add(self, offset: Tuple[int, int]) -> None:
+        """
+        Add a cursor at offset from the main cursor, unless there's one there already
+        """
+        if offset == (0, 0) or offset in self:
+            return
+        self.offsets.extend(offset)
+        self.version += 1
+
+    def set_grid(self, spacing: Tuple[int, int], size: Tuple[int, int]) -> None:
+        """
+        Replace the cursors with a grid that repeats the main cursor every spacing
+        pixels over an image of size. A spacing of 0 doesn't repeat along that axis.
+        Raise ValueError if the grid would have more than MAX_CURSORS cursors.
+        """
+        (spacing_x, spacing_y), (width, height) = spacing, size
+        columns = math.ceil(width / spacing_x) if spacing_x else 1
+        rows = math.ceil(height / spacing_y) if spacing_y else 1
+        if rows * columns > MAX_CURSORS:
+            raise ValueError(
+                f"a grid spaced by {spacing} would have {rows * columns} cursors, "
+                f"more than {MAX_CURSORS}"
+            )
+
+        self.offsets = array("i")
+        for row in range(rows):
+            for column in range(columns):
+                if row or column:
+                    self.offsets.extend((column * spacing_x, row * spacing_y))
+        self.version += 1
+
+    def clear(self) -> None:
+        self.offsets = array("i")
+        self.version += 1
+
+    def offset_pairs(self) -> List[Tuple[int, int]]:
+        """
+        Return the x and y offset of every cursor from the main cursor
+        """
+        offsets = iter(self.offsets)
+        return list(zip(offsets, offsets))
+
+    def positions(
+        self, cursor: Tuple[int, int], size: Tuple[int, int]
+    ) -> List[Tuple[int, int]]:
+        """
+        Return the position of the main cursor followed by the positions of every cursor
+        """
+        (x, y), (width, height) = cursor, size
+        offsets = iter(self.offsets)
+        return [(x, y)] + [
+            ((x + dx) % width, (y + dy) % height) for dx, dy in zip(offsets, offsets)
+        ]
@@ -4,14 +4,53 @@ import pygame as pg
 
 
 class KeyBinding:
+    """
+    Keycode the user presses to call func. If shift is True, the binding only
+    matches when shift is held, otherwise it only matches when shift isn't held.
+    Bindings that aren't recordable are left out of macros.
+    """
+
     def __init__(
-        self, keycode: int, group: str, func: typing.Callable, on_pressed=False
+        self,
+        keycode: int,
+        group: str,
+        func: typing.Callable,
+        on_pressed=False,
+        shift=False,
+        recordable=True,
     ):
         self.keycode = keycode
         self.group = group
         self.func = func
         self.on_pressed = on_pressed
-        logging.debug(f"Keybinding created: {str(self)}")
+        self.shift = shift
+        self.recordable = recordable
+        logging.debug("Keybinding created: %s", self)
+
+    @property
+    def name(self) -> str:
+        """
+        Name of the key shown to the user, prefixed with the modifier if there is one
+        """
+        key_name = pg.key.name(self.keycode)
+        return f"shift+{key_name}" if self.shift else key_name
+
+    def matches(self, event: pg.event.Event) -> bool:
+        """
+        Return whether the KEYDOWN event is a press of this binding
+        """
+        # Events posted by the program instead of the keyboard may not have modifiers
+        mod = getattr(event, "mod", pg.KMOD_NONE)
+        return event.key == self.keycode and self.shift == bool(mod & pg.KMOD_SHIFT)
+
+    def is_held(self, pressed_keys: typing.Sequence[bool], mods: int) -> bool:
+        """
+        Return whether this binding is held down, given the keys returned by
+        pg.key.get_pressed and the modifiers returned by pg.key.get_mods
+        """
+        return bool(pressed_keys[self.keycode]) and self.shift == bool(
+            mods & pg.KMOD_SHIFT
+        )
 
     def __str__(self):
-        return f"(keycode={pg.key.name(self.keycode)}, group={self.group})"
+        return f"(keycode={self.name}, group={self.group})"
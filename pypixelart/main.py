@@ -1,11 +1,17 @@
+import time
+
+_process_start = time.perf_counter()
+
+import atexit
 import logging
+from pathlib import Path
 
 import click
-import pygame as pg
-import pygame.font
 
-from pypixelart import PyPixelArt
-from pypixelart.utils import *
+from pypixelart.startup_trace import StartupTrace
+
+startup_trace = StartupTrace(_process_start)
+startup_trace.add("import click and the standard library", _process_start)
 
 
 def print_welcome_msg(func):
@@ -43,35 +49,205 @@ def print_welcome_msg(func):
     default=False,
     help="Print debug-level logging to standard output",
 )
-def main(filepath, resolution, debug):
+@click.option(
+    "--startup-trace",
+    "show_startup_trace",
+    is_flag=True,
+    default=False,
+    help="Print how long each import and initialization step took during startup",
+)
+@click.option(
+    "--metrics",
+    "metrics_path",
+    type=click.Path(dir_okay=False),
+    help="Collect metrics of the session and write them to this file on exit, as JSON if it ends in .json and in the Prometheus text format otherwise",
+)
+@click.option(
+    "--sidecar-cache",
+    "use_sidecar_cache",
+    is_flag=True,
+    default=False,
+    help="Keep an uncompressed copy of unsaved changes next to the file, and recover them from it when opening the file again",
+)
+@click.option(
+    "--remote",
+    "remote_address",
+    help="Accept edits from other programs as JSON lines on this Unix socket path, or on host:port over TCP",
+)
+@click.option(
+    "--stats",
+    "print_stats",
+    is_flag=True,
+    default=False,
+    help="Print statistics of the image as JSON and exit: unique colors, bounding box of the content, palette histogram and, when unsaved changes are recovered, pixels changed from the file",
+)
+@click.option(
+    "--config",
+    "config_path",
+    type=click.Path(dir_okay=False, exists=True, path_type=Path),
+    help="TOML or JSON file with keybindings, palette and performance settings. Defaults to config.toml or config.json in the user's config directory, if there is one",
+)
+def main(
+    filepath,
+    resolution,
+    debug,
+    show_startup_trace,
+    metrics_path,
+    use_sidecar_cache,
+    remote_address,
+    print_stats,
+    config_path,
+):
     level = logging.DEBUG if debug else logging.WARNING
     logging.basicConfig(
         format="%(levelname)s:%(filename)s:%(funcName)s:%(lineno)d:%(message)s",
         level=level,
     )
-    logging.info(f"Called with arguments '{filepath}' and '{resolution}'")
+    logging.info("Called with arguments '%s' and '%s'", filepath, resolution)
+
+    # pygame and the editor are imported here instead of at the top of the module
+    # so that --help and argument errors don't pay for them
+    with startup_trace.step("import pygame"):
+        import pygame as pg
+
+    # Imported after the pygame step, since the metrics module imports pygame and
+    # would otherwise move its cost out of that step
+    if metrics_path:
+        from pypixelart.metrics import metrics
+
+        metrics.enabled = True
+        atexit.register(metrics.export, Path(metrics_path))
+
+    # Only the display and font modules are used, so the other subsystems
+    # that pg.init() would start, like audio and joystick, are left alone
+    with startup_trace.step("init display"):
+        pg.display.init()
+    with startup_trace.step("init font"):
+        pg.font.init()
 
-    pg.init()
+    # The modules of the optional features are only imported in the branches of
+    # the options that use them, and the editor itself only once it's started
+
+    app_dir = Path(click.get_app_dir("pypixelart"))
+    if config_path is None:
+        config_path = next(
+            (
+                app_dir / name
+                for name in ("config.toml", "config.json")
+                if (app_dir / name).is_file()
+            ),
+            None,
+        )
+    config = None
+    if config_path is not None:
+        with startup_trace.step("load config"):
+            from pypixelart.config import ConfigError, load_config
+
+            try:
+                config = load_config(config_path, cache_dir=app_dir / "cache")
+            except ConfigError as e:
+                raise click.ClickException(str(e))
 
     path = Path(filepath)
-    if path.exists() and path.is_file():
-        logging.info(f"Path '{path}' exists and is file. Now loading as image.")
-        image = pg.image.load(path)
+    is_project = path.suffix.lower() == ".ppa"
+    project = None
+    if is_project:
+        from pypixelart.project_file import DEFAULT_TILE_SIZE, ProjectFile
+        from pypixelart.project_file import ProjectFileError
+    sidecar_cache = None
+    if use_sidecar_cache:
+        from pypixelart.sidecar_cache import SidecarCache
+
+        sidecar_cache = SidecarCache(path)
+    recovered_image = sidecar_cache.load() if sidecar_cache else None
+    if recovered_image is not None:
+        click.echo(f"Recovered unsaved changes from {sidecar_cache.path}")
+        image = recovered_image
+    elif path.exists() and path.is_file():
+        logging.info("Path '%s' exists and is file. Now loading as image.", path)
+        with startup_trace.step("load image"):
+            if is_project:
+                try:
+                    project = ProjectFile.open(path)
+                except ProjectFileError as e:
+                    raise click.ClickException(str(e))
+                image = project.image
+            else:
+                from pypixelart.png_stream import load_image
+
+                try:
+                    image = load_image(path)
+                except pg.error as e:
+                    raise click.ClickException(f"Couldn't load {path}: {e}")
     else:
         logging.info("No valid path was provided, creating new surface.")
 
         if resolution:
             img_size = tuple(map(int, resolution.split(",")))
-            logging.info(f"Resolution {img_size} loaded from click argument")
+            logging.info("Resolution %s loaded from click argument", img_size)
         else:
             width = int(input("Image width: "))
             height = int(input("Image height: "))
             img_size = width, height
-            logging.info(f"Resolution {img_size} loaded from input")
+            logging.info("Resolution %s loaded from input", img_size)
+
+        with startup_trace.step("create image"):
+            image = pg.Surface(img_size, pg.SRCALPHA)
+
+    # New projects, and projects recovered from the sidecar cache, are written in full on save
+    if is_project and project is None:
+        project = ProjectFile(path, image, DEFAULT_TILE_SIZE)
+
+    if print_stats:
+        import json
+
+        from pypixelart.analysis import ImageStats, load_reference
+        from pypixelart.constants import DEFAULT_PALETTE
+
+        if project is not None:
+            project.load_all()
+        reference = load_reference(path) if recovered_image is not None else None
+        palette = DEFAULT_PALETTE
+        if project and project.palette:
+            palette = project.palette
+        elif config is not None:
+            palette = config.palette_colors(DEFAULT_PALETTE)
+        click.echo(json.dumps(ImageStats(image, reference).to_dict(palette), indent=2))
+        return
+
+    remote_server = None
+    if remote_address:
+        with startup_trace.step("start remote server"):
+            from pypixelart.remote import RemoteServer
+
+            remote_server = RemoteServer(remote_address)
+            remote_server.start()
+            atexit.register(remote_server.close)
+        click.echo(f"Accepting remote edits on {remote_address}")
+
+    with startup_trace.step("import pypixelart"):
+        from pypixelart import PyPixelArt
+
+        # Already imported by PyPixelArt, whose settings come from a Config
+        from pypixelart.config import ConfigError
+
+    with startup_trace.step("create window"):
+        try:
+            pypixelart = PyPixelArt(
+                image,
+                path,
+                app_name=click.get_current_context().command.name,
+                sidecar_cache=sidecar_cache,
+                project=project,
+                remote_server=remote_server,
+                config=config,
+            )
+        except ConfigError as e:
+            raise click.ClickException(f"{config_path}: {e}")
 
-        image = pg.Surface(img_size, pygame.SRCALPHA)
+    if show_startup_trace:
+        click.echo(startup_trace.report())
 
-    pypixelart = PyPixelArt(image, path)
     pypixelart.run_loop()
 
 
@@ -0,0 +1,212 @@
+import bisect
+import contextlib
+import dataclasses
+import json
+import pathlib
+import time
+from typing import Callable, Dict, Tuple
+
+import pygame as pg
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Metric names and label pairs, e.g. ("commands_executed", (("type", "DrawSpans"),))
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    """
+    Count of observations that fell in each bucket, plus their count and sum
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms of what the editor does, exported to a file so
+    sessions can be compared. While disabled every method returns right away, so
+    the calls left in the code cost close to nothing.
+    """
+
+    def __init__(self):
+        self.enabled: bool = False
+        self.counters: Dict[MetricKey, float] = {}
+        self.gauges: Dict[MetricKey, float] = {}
+        self.histograms: Dict[MetricKey, Histogram] = {}
+        # Functions decorated with functools.lru_cache whose hit rate is exported
+        self.caches: Dict[str, Callable] = {}
+        # Gauges that are only worth computing when the metrics are exported
+        self.gauge_functions: Dict[str, Callable[[], float]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = name, tuple(sorted(labels.items()))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        self.gauges[name, tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = name, tuple(sorted(labels.items()))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].observe(value)
+
+    def timer(self, name: str, **labels: str):
+        """
+        Return a context manager that observes how many seconds the with block took
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timer(name, labels)
+
+    @contextlib.contextmanager
+    def _timer(self, name: str, labels: Dict[str, str]):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def register_cache(self, name: str, cached_function: Callable) -> None:
+        """
+        Export the hits and misses of a function decorated with functools.lru_cache
+        """
+        self.caches[name] = cached_function
+
+    def register_gauge(self, name: str, gauge_function: Callable[[], float]) -> None:
+        """
+        Export the value returned by gauge_function, calling it only when exporting
+        """
+        self.gauge_functions[name] = gauge_function
+
+    def _collected_gauges(self) -> Dict[MetricKey, float]:
+        gauges = dict(self.gauges)
+        for name, gauge_function in self.gauge_functions.items():
+            gauges[name, ()] = gauge_function()
+        for name, cached_function in self.caches.items():
+            info = cached_function.cache_info()
+            labels = (("cache", name),)
+            lookups = info.hits + info.misses
+            gauges["cache_hits", labels] = info.hits
+            gauges["cache_misses", labels] = info.misses
+            gauges["cache_hit_rate", labels] = info.hits / lookups if lookups else 0
+        return gauges
+
+    def to_dict(self) -> dict:
+        """
+        Return every metric as a dict that can be serialized to JSON
+        """
+
+        def entries(metrics: dict, value: Callable) -> list:
+            return [
+                {"name": name, "labels": dict(labels), **value(metric)}
+                for (name, labels), metric in sorted(metrics.items())
+            ]
+
+        return {
+            "counters": entries(self.counters, lambda v: {"value": v}),
+            "gauges": entries(self._collected_gauges(), lambda v: {"value": v}),
+            "histograms": entries(
+                self.histograms,
+                lambda h: {
+                    "count": h.count,
+                    "sum": h.sum,
+                    "buckets": dict(
+                        zip([str(b) for b in h.buckets] + ["+Inf"], h.bucket_counts)
+                    ),
+                },
+            ),
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Return every metric in the Prometheus text exposition format
+        """
+
+        def sample(name: str, labels: tuple, value: float) -> str:
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            label_text = f"{{{label_text}}}" if label_text else ""
+            return f"pypixelart_{name}{label_text} {value}"
+
+        lines = []
+        typed = set()
+
+        def add_type(name: str, metric_type: str) -> None:
+            # Samples are sorted by name, so each family gets its line before them
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE pypixelart_{name} {metric_type}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            add_type(f"{name}_total", "counter")
+            lines.append(sample(f"{name}_total", labels, value))
+        for (name, labels), value in sorted(self._collected_gauges().items()):
+            add_type(name, "gauge")
+            lines.append(sample(name, labels, value))
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            add_type(name, "histogram")
+            cumulative = 0
+            bounds = [str(b) for b in histogram.buckets] + ["+Inf"]
+            for bound, bucket_count in zip(bounds, histogram.bucket_counts):
+                cumulative += bucket_count
+                lines.append(
+                    sample(f"{name}_bucket", labels + (("le", bound),), cumulative)
+                )
+            lines.append(sample(f"{name}_count", labels, histogram.count))
+            lines.append(sample(f"{name}_sum", labels, histogram.sum))
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: pathlib.Path) -> None:
+        """
+        Write the metrics to path, as JSON if it ends in .json and in the Prometheus
+        text format otherwise
+        """
+        if not self.enabled:
+            return
+        path = pathlib.Path(path)
+        if path.suffix == ".json":
+            path.write_text(json.dumps(self.to_dict(), indent=2))
+        else:
+            path.write_text(self.to_prometheus())
+
+
+def estimate_bytes(value, canvas: pg.Surface = None) -> int:
+    """
+    Estimate how many bytes of pixel data value keeps alive, looking into lists, tuples
+    and the fields of dataclasses such as commands. The canvas is shared by every command, so it's not counted.
+    """
+    if value is None or value is canvas:
+        return 0
+    if isinstance(value, pg.Surface):
+        return value.get_width() * value.get_height() * value.get_bytesize()
+    if isinstance(value, pg.Color):
+        return 4
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_bytes(item, canvas) for item in value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return sum(
+            estimate_bytes(getattr(value, field.name), canvas)
+            for field in dataclasses.fields(value)
+        )
+    return 0
+
+
+# Metrics shared by the whole application, enabled with the --metrics option
+metrics = Metrics()
@@ -0,0 +1,330 @@
+import functools
+import logging
+import os
+import pathlib
+import struct
+import zlib
+from typing import BinaryIO, Iterator, Tuple
+
+import pygame as pg
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Images with fewer pixels than this are loaded and saved by pygame in one call
+STREAMING_THRESHOLD = 4096 * 4096
+
+# How many bytes of pixels are converted and compressed at a time
+STRIP_BYTES = 1 << 20
+
+# Maximum size of each IDAT chunk written
+IDAT_BYTES = 1 << 16
+
+# PNG color types that can be streamed, with the pygame format of their rows
+# and how many bytes each pixel takes
+STREAMED_COLOR_TYPES = {
+    0: ("P", 1),
+    2: ("RGB", 3),
+    6: ("RGBA", 4),
+}
+
+
+class NotStreamable(Exception):
+    """
+    The PNG file uses a feature the streaming reader doesn't handle
+    """
+
+
+def load_image(path: pathlib.Path) -> pg.Surface:
+    """
+    Load the image in path, streaming it if it's a big PNG file and
+    with pygame in one call otherwise
+    """
+    if path.suffix.lower() == ".png":
+        try:
+            with open(path, "rb") as file:
+                width, height, *_ = read_header(file)
+            if width * height >= STREAMING_THRESHOLD:
+                return read_png(path)
+        except NotStreamable as e:
+            logging.info("Can't stream %s (%s), loading it with pygame", path, e)
+
+    return pg.image.load(path)
+
+
+def save_image(image: pg.Surface, path: pathlib.Path) -> None:
+    """
+    Save image to path, streaming it if it's a big image saved as PNG and
+    with pygame in one call otherwise
+    """
+    if (
+        path.suffix.lower() == ".png"
+        and image.get_width() * image.get_height() >= STREAMING_THRESHOLD
+    ):
+        write_png(image, path)
+    else:
+        pg.image.save(image, path)
+
+
+def write_chunk(file: BinaryIO, chunk_type: bytes, data: bytes) -> None:
+    file.write(struct.pack(">I", len(data)))
+    file.write(chunk_type)
+    file.write(data)
+    file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+def read_chunks(file: BinaryIO) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    Yield the type and data of every chunk after the signature, up to IEND
+    """
+    while True:
+        chunk_header = file.read(8)
+        if len(chunk_header) < 8:
+            raise NotStreamable("file ends before IEND")
+        length, chunk_type = struct.unpack(">I4s", chunk_header)
+        data, crc_bytes = file.read(length), file.read(4)
+        if len(data) < length or len(crc_bytes) < 4:
+            raise NotStreamable(f"file ends inside {chunk_type} chunk")
+        (crc,) = struct.unpack(">I", crc_bytes)
+        if crc != zlib.crc32(data, zlib.crc32(chunk_type)):
+            raise NotStreamable(f"bad CRC in {chunk_type} chunk")
+        if chunk_type == b"IEND":
+            return
+        yield chunk_type, data
+
+
+def read_header(file: BinaryIO) -> Tuple[int, int, int, int, int]:
+    """
+    Read the signature and the IHDR chunk.
+    Return width, height, bit depth, color type and interlace method.
+    """
+    if file.read(8) != PNG_SIGNATURE:
+        raise NotStreamable("not a PNG file")
+
+    chunk_type, data = next(read_chunks(file))
+    if chunk_type != b"IHDR" or len(data) != 13:
+        raise NotStreamable("first chunk isn't a valid IHDR")
+
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack(
+        ">IIBBBBB", data
+    )
+    return width, height, bit_depth, color_type, interlace
+
+
+def add_bytes(a: int, b: int, low_bits: int, high_bits: int) -> int:
+    """
+    Return the sum of every byte of a with the same byte of b modulo 256, where a and b
+    are rows of bytes as little endian ints. low_bits has 0x7f in every byte of the row
+    and high_bits 0x80, so the low 7 bits are added without carrying into the next byte
+    and the high bit is added with a xor.
+    """
+    return ((a & low_bits) + (b & low_bits)) ^ ((a ^ b) & high_bits)
+
+
+@functools.lru_cache(maxsize=4)
+def byte_masks(row_bytes: int) -> Tuple[int, int]:
+    """
+    Return ints with 0x7f and with 0x80 in each of the row_bytes bytes, for add_bytes
+    """
+    return (
+        int.from_bytes(b"\x7f" * row_bytes, "little"),
+        int.from_bytes(b"\x80" * row_bytes, "little"),
+    )
+
+
+def unfilter_row(filter_type: int, row: bytes, prior: bytes, pixel_bytes: int) -> bytes:
+    """
+    Return the bytes of row with the PNG filter undone, given the previous row already
+    unfiltered, or zeros for the first row.
+
+    Sub and Up are undone on the whole row at once as big ints: Up adds the previous
+    row, and Sub adds every byte to the one a pixel later, doubling the distance at
+    every step until the sums span the row. Average and Paeth depend on the byte just
+    undone on their left, so they're undone one byte at a time, which takes a few
+    milliseconds per row of a large image.
+    """
+    if filter_type == 0:
+        return row
+    if filter_type in (1, 2):
+        row_bytes = len(row)
+        low_bits, high_bits = byte_masks(row_bytes)
+        value = int.from_bytes(row, "little")
+        if filter_type == 2:
+            value = add_bytes(
+                value, int.from_bytes(prior, "little"), low_bits, high_bits
+            )
+        else:
+            distance = pixel_bytes
+            while distance < row_bytes:
+                value = add_bytes(value, value << (8 * distance), low_bits, high_bits)
+                distance *= 2
+        return value.to_bytes(row_bytes, "little")
+
+    result = bytearray(row)
+    if filter_type == 3:
+        for i in range(pixel_bytes):
+            result[i] = (result[i] + (prior[i] >> 1)) & 0xFF
+        for i in range(pixel_bytes, len(result)):
+            result[i] = (result[i] + ((result[i - pixel_bytes] + prior[i]) >> 1)) & 0xFF
+    elif filter_type == 4:
+        for i in range(pixel_bytes):
+            result[i] = (result[i] + prior[i]) & 0xFF
+        # The distances of the Paeth predictor from left, up and up_left are
+        # |up - up_left|, |left - up_left| and the absolute value of their sum
+        for i, up_left, up in zip(
+            range(pixel_bytes, len(result)), prior, prior[pixel_bytes:]
+        ):
+            left = result[i - pixel_bytes]
+            left_distance = up - up_left
+            up_distance = left - up_left
+            up_left_distance = left_distance + up_distance
+            if left_distance < 0:
+                left_distance = -left_distance
+            if up_distance < 0:
+                up_distance = -up_distance
+            if up_left_distance < 0:
+                up_left_distance = -up_left_distance
+            if left_distance <= up_distance and left_distance <= up_left_distance:
+                result[i] = (result[i] + left) & 0xFF
+            elif up_distance <= up_left_distance:
+                result[i] = (result[i] + up) & 0xFF
+            else:
+                result[i] = (result[i] + up_left) & 0xFF
+    else:
+        raise NotStreamable(f"unknown row filter {filter_type}")
+    return bytes(result)
+
+
+def rows_per_strip(row_bytes: int) -> int:
+    return max(1, STRIP_BYTES // row_bytes)
+
+
+def write_png(image: pg.Surface, path: pathlib.Path, level: int = 6) -> None:
+    """
+    Encode image as an 8-bit RGBA PNG a strip of rows at a time, so only one strip of
+    uncompressed pixels and one IDAT chunk are in memory besides the image itself.
+
+    Rows are written without filtering, which compresses worse than pygame's adaptive
+    filters but needs no per-byte work in Python. The file is written next to path and
+    then moved over it, so an interrupted save doesn't destroy the previous file.
+    """
+    width, height = image.get_size()
+    row_bytes = width * 4
+    temporary_path = path.with_name(path.name + ".tmp")
+
+    with open(temporary_path, "wb") as file:
+        file.write(PNG_SIGNATURE)
+        write_chunk(
+            file, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+        )
+
+        compressor = zlib.compressobj(level)
+        compressed = bytearray()
+        strip_height = rows_per_strip(row_bytes)
+        for y in range(0, height, strip_height):
+            rows = min(strip_height, height - y)
+            pixels = pg.image.tostring(image.subsurface((0, y, width, rows)), "RGBA")
+            compressed += compressor.compress(
+                b"".join(
+                    b"\x00" + pixels[i : i + row_bytes]
+                    for i in range(0, len(pixels), row_bytes)
+                )
+            )
+            while len(compressed) >= IDAT_BYTES:
+                write_chunk(file, b"IDAT", bytes(compressed[:IDAT_BYTES]))
+                del compressed[:IDAT_BYTES]
+
+        compressed += compressor.flush()
+        if compressed:
+            write_chunk(file, b"IDAT", bytes(compressed))
+        write_chunk(file, b"IEND", b"")
+
+    os.replace(temporary_path, path)
+
+
+def read_png(path: pathlib.Path) -> pg.Surface:
+    """
+    Decode a PNG file into a surface a strip of rows at a time, so only one IDAT chunk
+    and one strip of uncompressed pixels are in memory besides the surface itself.
+
+    Only 8-bit grayscale, RGB and RGBA images without interlacing can be streamed.
+    NotStreamable is raised for anything else, and for corrupt files. Rows without a
+    filter, like the ones written by write_png, are copied as they are, while filtered
+    rows, like the ones written by libpng, are undone with unfilter_row.
+    """
+    with open(path, "rb") as file:
+        width, height, bit_depth, color_type, interlace = read_header(file)
+        if bit_depth != 8 or color_type not in STREAMED_COLOR_TYPES or interlace:
+            raise NotStreamable(
+                f"bit depth {bit_depth}, color type {color_type}, interlace {interlace}"
+            )
+
+        row_format, pixel_bytes = STREAMED_COLOR_TYPES[color_type]
+        row_bytes = width * pixel_bytes
+        strip_height = rows_per_strip(row_bytes)
+
+        # Allocated at the first IDAT chunk, once the chunks before it were checked
+        surface: pg.Surface = None
+        decompressor = zlib.decompressobj()
+        pending = bytearray()
+        prior = bytes(row_bytes)
+        y = 0
+
+        def blit_rows(rows: int) -> None:
+            nonlocal y, prior
+            filtered_row_bytes = row_bytes + 1
+            strip = pending[: rows * filtered_row_bytes]
+            filters = strip[::filtered_row_bytes]
+            if filters.count(0) == rows:
+                pixels = b"".join(
+                    strip[i + 1 : i + filtered_row_bytes]
+                    for i in range(0, len(strip), filtered_row_bytes)
+                )
+                prior = pixels[-row_bytes:]
+            else:
+                unfiltered_rows = []
+                for i in range(0, len(strip), filtered_row_bytes):
+                    prior = unfilter_row(
+                        strip[i],
+                        bytes(strip[i + 1 : i + filtered_row_bytes]),
+                        prior,
+                        pixel_bytes,
+                    )
+                    unfiltered_rows.append(prior)
+                pixels = b"".join(unfiltered_rows)
+            rows_surface = pg.image.frombuffer(pixels, (width, rows), row_format)
+            if row_format == "P":
+                rows_surface.set_palette([(i, i, i) for i in range(256)])
+            # The surface starts transparent, so adding the rows copies them exactly
+            surface.blit(rows_surface, (0, y), special_flags=pg.BLEND_RGBA_ADD)
+            del pending[: rows * filtered_row_bytes]
+            y += rows
+
+        for chunk_type, data in read_chunks(file):
+            if chunk_type == b"tRNS":
+                raise NotStreamable("tRNS chunk")
+            if chunk_type != b"IDAT":
+                continue
+            if surface is None:
+                surface = pg.Surface((width, height), pg.SRCALPHA)
+
+            # Decompress a strip at a time, since a small chunk can inflate to a lot of pixels
+            while data:
+                try:
+                    pending += decompressor.decompress(data, STRIP_BYTES)
+                except zlib.error as e:
+                    raise NotStreamable(f"corrupt image data: {e}") from e
+                data = decompressor.unconsumed_tail
+                while len(pending) >= strip_height * (row_bytes + 1) and y < height:
+                    blit_rows(min(strip_height, height - y))
+
+        try:
+            pending += decompressor.flush()
+        except zlib.error as e:
+            raise NotStreamable(f"corrupt image data: {e}") from e
+        while y < height:
+            rows = min(strip_height, height - y, len(pending) // (row_bytes + 1))
+            if rows == 0:
+                raise NotStreamable("image data ends early")
+            blit_rows(rows)
+
+    return surface
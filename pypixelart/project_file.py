@@ -0,0 +1,351 @@
+import logging
+import math
+import mmap
+import pathlib
+import struct
+import time
+import zlib
+from fractions import Fraction
+from typing import Dict, List, Tuple
+
+import pygame as pg
+
+PROJECT_MAGIC = b"PPAPROJ\x00"
+PROJECT_VERSION = 2
+
+# magic, version, width, height, tile size, cursor x, cursor y,
+# zoom numerator, zoom denominator, number of palette colors
+PROJECT_HEADER = struct.Struct(">8sHIIHIIIIH")
+
+# Every palette entry is an RGBA color followed by the length of its UTF-8 name and
+# the name, padded with zeros
+PALETTE_ENTRY = struct.Struct(">4BB31s")
+PALETTE_NAME_SIZE = 31
+PALETTE_SIZE = 256
+
+# Offset, compressed length and capacity of the slot of every tile in the file.
+# Tiles where every pixel is transparent have a length of 0 and no data.
+TILE_INDEX_ENTRY = struct.Struct(">QII")
+
+DEFAULT_TILE_SIZE = 256
+
+
+class ProjectFileError(ValueError):
+    """
+    The file isn't a project file of this version, or it's truncated or corrupt
+    """
+
+
+def encode_palette_names(names: List[str]) -> List[bytes]:
+    """
+    Return the names encoded as UTF-8 to be stored in palette entries. Names too long for
+    an entry are shortened at a character boundary, and numbered if that makes them equal
+    to another name, so every color can still be looked up by its name.
+    """
+    encoded = []
+    seen = set()
+    for name in names:
+        unique_name, number = name, 2
+        while True:
+            data = shorten_utf8(unique_name.encode(), PALETTE_NAME_SIZE)
+            if data not in seen:
+                break
+            suffix = f" {number}".encode()
+            data = shorten_utf8(name.encode(), PALETTE_NAME_SIZE - len(suffix)) + suffix
+            unique_name, number = data.decode(), number + 1
+        if data != name.encode():
+            logging.warning(
+                "Palette color %r is saved as %r, names can have at most %d bytes",
+                name,
+                data.decode(),
+                PALETTE_NAME_SIZE,
+            )
+        seen.add(data)
+        encoded.append(data)
+    return encoded
+
+
+def shorten_utf8(data: bytes, size: int) -> bytes:
+    """
+    Return the first size bytes of the UTF-8 string data, without cutting a character
+    """
+    return data[:size].decode(errors="ignore").encode()
+
+
+class ProjectFile:
+    """
+    Native .ppa project file: a header with the image size, cursor and zoom, the palette,
+    an index of tiles and then every tile of the image compressed with zlib on its own.
+
+    Opening memory-maps the file and only reads the header, palette and index. Tiles are
+    decoded into the image later, a few per frame, so big canvases show up right away.
+    Saving rewrites only the tiles that changed, in place when they still fit in their slot
+    and at the end of the file otherwise.
+    """
+
+    def __init__(self, path: pathlib.Path, image: pg.Surface, tile_size: int):
+        self.path: pathlib.Path = path
+        self.image: pg.Surface = image
+        self.tile_size: int = tile_size
+        self.tiles_x: int = math.ceil(image.get_width() / tile_size)
+        self.tiles_y: int = math.ceil(image.get_height() / tile_size)
+
+        self.cursor: Tuple[int, int] = (0, 0)
+        self.zoom_scale: Fraction = None
+        self.palette: Dict[str, pg.Color] = {}
+
+        # (offset, length, capacity) of every tile, None until the file is written
+        self.tile_index: List[Tuple[int, int, int]] = None
+        # Tiles that changed since the last save, or every tile if it was never saved
+        self.dirty_tiles: set = set(range(self.tiles_x * self.tiles_y))
+        # Tiles still waiting to be decoded from the memory-mapped file
+        self.pending_tiles: List[int] = []
+        # Tiles that couldn't be decoded and were left transparent
+        self.corrupt_tiles: set = set()
+        self._file = None
+        self._map: mmap.mmap = None
+
+    @property
+    def index_offset(self) -> int:
+        return PROJECT_HEADER.size + PALETTE_SIZE * PALETTE_ENTRY.size
+
+    @property
+    def data_offset(self) -> int:
+        return self.index_offset + self.tiles_x * self.tiles_y * TILE_INDEX_ENTRY.size
+
+    @property
+    def is_loading(self) -> bool:
+        return bool(self.pending_tiles)
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> "ProjectFile":
+        """
+        Memory-map the project in path and read everything but the tiles.
+        Raise ProjectFileError if it isn't a valid project file.
+        """
+        file = open(path, "rb")
+        file_map = None
+        try:
+            # Raises ValueError if the file is empty
+            file_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            project = cls._read(path, file_map)
+        except (struct.error, ValueError, pg.error) as e:
+            if file_map is not None:
+                file_map.close()
+            file.close()
+            if isinstance(e, ProjectFileError):
+                raise
+            raise ProjectFileError(f"{path} is truncated or corrupt: {e}") from e
+
+        project._file, project._map = file, file_map
+        logging.info(
+            "Opened project %s with %d tiles to decode",
+            path,
+            len(project.pending_tiles),
+        )
+        return project
+
+    @classmethod
+    def _read(cls, path: pathlib.Path, file_map: mmap.mmap) -> "ProjectFile":
+        (
+            magic,
+            version,
+            width,
+            height,
+            tile_size,
+            cursor_x,
+            cursor_y,
+            zoom_numerator,
+            zoom_denominator,
+            palette_count,
+        ) = PROJECT_HEADER.unpack_from(file_map, 0)
+        if magic != PROJECT_MAGIC or version != PROJECT_VERSION:
+            raise ProjectFileError(
+                f"{path} isn't a version {PROJECT_VERSION} project file"
+            )
+        if not tile_size or not zoom_denominator or palette_count > PALETTE_SIZE:
+            raise ProjectFileError(f"{path} has an invalid header")
+
+        project = cls(path, pg.Surface((width, height), pg.SRCALPHA), tile_size)
+        project.cursor = cursor_x, cursor_y
+        project.zoom_scale = Fraction(zoom_numerator, zoom_denominator)
+
+        for i in range(palette_count):
+            *rgba, name_length, name = PALETTE_ENTRY.unpack_from(
+                file_map, PROJECT_HEADER.size + i * PALETTE_ENTRY.size
+            )
+            project.palette[name[:name_length].decode()] = pg.Color(*rgba)
+
+        project.tile_index = [
+            TILE_INDEX_ENTRY.unpack_from(
+                file_map, project.index_offset + i * TILE_INDEX_ENTRY.size
+            )
+            for i in range(project.tiles_x * project.tiles_y)
+        ]
+        if any(
+            offset + length > len(file_map) for offset, length, _ in project.tile_index
+        ):
+            raise ProjectFileError(f"{path} is truncated, tiles are missing")
+
+        project.dirty_tiles.clear()
+        project.pending_tiles = [
+            tile for tile, (_, length, _) in enumerate(project.tile_index) if length
+        ]
+        project.prioritize(project.cursor)
+        return project
+
+    def tile_rect(self, tile: int) -> pg.Rect:
+        tile_y, tile_x = divmod(tile, self.tiles_x)
+        return pg.Rect(
+            tile_x * self.tile_size,
+            tile_y * self.tile_size,
+            self.tile_size,
+            self.tile_size,
+        ).clip(self.image.get_rect())
+
+    def tiles_in(self, rect: pg.Rect) -> List[int]:
+        """
+        Return the indices of the tiles that overlap rect
+        """
+        rect = rect.clip(self.image.get_rect())
+        if not rect.w or not rect.h:
+            return []
+        first_x, last_x = rect.x // self.tile_size, (rect.right - 1) // self.tile_size
+        first_y, last_y = rect.y // self.tile_size, (rect.bottom - 1) // self.tile_size
+        return [
+            tile_y * self.tiles_x + tile_x
+            for tile_y in range(first_y, last_y + 1)
+            for tile_x in range(first_x, last_x + 1)
+        ]
+
+    def prioritize(self, position: Tuple[int, int]) -> None:
+        """
+        Decode the tiles closest to position first
+        """
+        x, y = position
+        self.pending_tiles.sort(
+            key=lambda tile: (self.tile_rect(tile).centerx - x) ** 2
+            + (self.tile_rect(tile).centery - y) ** 2
+        )
+
+    def load_tiles(self, budget_seconds: float) -> List[pg.Rect]:
+        """
+        Decode pending tiles into the image until budget_seconds have passed.
+        Return the rects of the decoded tiles.
+        """
+        deadline = time.perf_counter() + budget_seconds
+        decoded = []
+        while self.pending_tiles and (not decoded or time.perf_counter() < deadline):
+            decoded.append(self._decode_next_tile())
+
+        if not self.pending_tiles:
+            self._close_map()
+        return decoded
+
+    def load_all(self) -> None:
+        """
+        Decode every pending tile, for operations that need the whole image
+        """
+        while self.pending_tiles:
+            self._decode_next_tile()
+        self._close_map()
+
+    def _decode_next_tile(self) -> pg.Rect:
+        """
+        Decode the first pending tile, leaving it transparent if it's corrupt.
+        Return its rect.
+        """
+        tile = self.pending_tiles.pop(0)
+        try:
+            return self._decode_tile(tile)
+        except ProjectFileError as e:
+            logging.error("%s, leaving it transparent", e)
+            self.corrupt_tiles.add(tile)
+            return self.tile_rect(tile)
+
+    def _decode_tile(self, tile: int) -> pg.Rect:
+        """
+        Decode tile into the image. Raise ProjectFileError if its data is corrupt.
+        """
+        offset, length, _ = self.tile_index[tile]
+        rect = self.tile_rect(tile)
+        try:
+            pixels = zlib.decompress(self._map[offset : offset + length])
+            tile_surface = pg.image.frombuffer(pixels, rect.size, "RGBA")
+        except (zlib.error, ValueError) as e:
+            raise ProjectFileError(f"{self.path}: tile {tile} is corrupt: {e}") from e
+        # Tiles start transparent, so adding the decoded pixels copies them exactly
+        self.image.blit(tile_surface, rect, special_flags=pg.BLEND_RGBA_ADD)
+        return rect
+
+    def _close_map(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def mark_dirty(self, *rects: pg.Rect) -> None:
+        for rect in rects:
+            self.dirty_tiles.update(self.tiles_in(rect))
+
+    def save(self) -> None:
+        """
+        Write the header, palette and index, and the tiles that changed since the last save
+        """
+        self.load_all()
+
+        if self.tile_index is None or not self.path.is_file():
+            self.tile_index = [(0, 0, 0)] * (self.tiles_x * self.tiles_y)
+            self.dirty_tiles = set(range(self.tiles_x * self.tiles_y))
+            with open(self.path, "wb") as file:
+                file.truncate(self.data_offset)
+
+        with open(self.path, "r+b") as file:
+            end_of_file = file.seek(0, 2)
+            for tile in sorted(self.dirty_tiles):
+                offset, _, capacity = self.tile_index[tile]
+                rect = self.tile_rect(tile)
+                subsurface = self.image.subsurface(rect)
+
+                # Transparent tiles aren't stored, they're transparent when decoded anyway
+                if subsurface.get_bounding_rect(min_alpha=1).size == (0, 0):
+                    self.tile_index[tile] = offset, 0, capacity
+                    continue
+
+                data = zlib.compress(pg.image.tostring(subsurface, "RGBA"), 6)
+                if len(data) > capacity:
+                    # Leave room for the tile to grow a bit before it has to move again
+                    offset, capacity = end_of_file, len(data) + len(data) // 4
+                    end_of_file += capacity
+                file.seek(offset)
+                file.write(data)
+                self.tile_index[tile] = offset, len(data), capacity
+            file.truncate(end_of_file)
+
+            file.seek(0)
+            zoom = self.zoom_scale or Fraction(1)
+            file.write(
+                PROJECT_HEADER.pack(
+                    PROJECT_MAGIC,
+                    PROJECT_VERSION,
+                    self.image.get_width(),
+                    self.image.get_height(),
+                    self.tile_size,
+                    *self.cursor,
+                    zoom.numerator,
+                    zoom.denominator,
+                    min(len(self.palette), PALETTE_SIZE),
+                )
+            )
+            palette = list(self.palette.items())[:PALETTE_SIZE]
+            names = encode_palette_names([name for name, _ in palette])
+            for (_, color), name in zip(palette, names):
+                file.write(PALETTE_ENTRY.pack(*color, len(name), name))
+
+            file.seek(self.index_offset)
+            file.write(
+                b"".join(TILE_INDEX_ENTRY.pack(*entry) for entry in self.tile_index)
+            )
+
+        logging.info("Saved %d tiles of %s", len(self.dirty_tiles), self.path)
+        self.dirty_tiles.clear()
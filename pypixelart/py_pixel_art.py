@@ -1,36 +1,66 @@
 import logging
 import pathlib
 import sys
+import time
+from typing import TYPE_CHECKING, List, Tuple, Union
 
 import click
 import pygame as pg
 
-from pypixelart.command.commands import DrawPixelAtCursor
+from pypixelart.command.commands import (
+    DrawPixelAtCursor,
+    DrawPixels,
+    DrawSpans,
+    BlitRegion,
+    MoveRegion,
+)
 from pypixelart.command.controller import CommandController
+from pypixelart.config import Config, apply_bindings
+from pypixelart.cursor_set import CursorSet
 from pypixelart.keybinding import KeyBinding
+from pypixelart.metrics import metrics, estimate_bytes
 from pypixelart.point import Point
+from pypixelart.shapes import line_spans, rectangle_spans, ellipse_spans
+from pypixelart.symmetry import get_symmetry_map
 from pypixelart.symmetry_type import SymmetryType
+from pypixelart.zoom import ZoomEngine
 from pypixelart.utils import (
     draw_keybindings,
     draw_grid,
     draw_help_keybind,
     draw_header_text,
     draw_scaled_image,
+    draw_tiled_image,
+    draw_statistics,
     draw_rect_around_resized_img,
     draw_symmetry_line,
     draw_selected_color,
     draw_color_selection,
     draw_cursor_coordinates,
+    copy_region,
+    draw_recording_indicator,
 )
 from pypixelart.constants import (
     GREY,
     BLACK,
     WHITE,
     LIGHTER_GREY,
+    RED,
+    CURSOR_SET_COLOR,
+    DEFAULT_PALETTE,
+    PALETTE_PAGE_SIZE,
     DEFAULT_BORDER_RADIUS,
     ALPHA,
 )
 
+# The optional features are only imported when they're used, so that starting the
+# editor doesn't pay for the ones that are off
+if TYPE_CHECKING:
+    from pypixelart.analysis import ImageStats
+    from pypixelart.project_file import ProjectFile
+    from pypixelart.remote import RemoteServer
+    from pypixelart.sidecar_cache import SidecarCache
+
 
 class PyPixelArt:
     """
@@ -38,8 +68,20 @@ class PyPixelArt:
     calls the corresponding methods when a keybinding is called, draws the UI on the screen, etc.
     """
 
-    def __init__(self, image: pg.Surface, path: pathlib.Path):
-        logging.info(f"Instantiated PyPixelArt with path {path}")
+    def __init__(
+        self,
+        image: pg.Surface,
+        path: pathlib.Path,
+        app_name: str = "PyPixelArt",
+        sidecar_cache: "SidecarCache" = None,
+        project: "ProjectFile" = None,
+        remote_server: "RemoteServer" = None,
+        config: Config = None,
+    ):
+        logging.info("Instantiated PyPixelArt with path %s", path)
+
+        # Keybindings, palette and performance settings loaded from the user's config
+        self.config: Config = config if config is not None else Config()
 
         self.image: pg.Surface = image
         self.path: pathlib.Path = path
@@ -50,13 +92,32 @@ class PyPixelArt:
         self.screen: pg.Surface = pg.display.set_mode(
             (window_width, window_height), pg.RESIZABLE
         )
-        self.app_name: str = click.get_current_context().command.name
+        self.app_name: str = app_name
 
         pg.display.set_caption(self.app_name)
 
         self.cursor_position: Point = Point(0, 0)
         self.cursor_draw_color: pg.Color = WHITE
 
+        # Position marked as the start of the next line, rectangle or ellipse
+        self.mark_position: Point = None
+        self.is_filling_shapes: bool = False
+
+        # Corner of the selection that stays in place while the cursor moves the other corner
+        self.selection_anchor: Point = None
+        # Selection being moved, which follows the cursor until it's dropped
+        self.lifted_selection: pg.Rect = None
+        self.clipboard: pg.Surface = None
+
+        # Extra cursors that draw and erase together with the main cursor
+        self.cursor_set: CursorSet = CursorSet()
+        self._cursor_set_overlay: Tuple[pg.Surface, Tuple[int, int]] = None
+        self._cursor_set_overlay_key: tuple = None
+
+        # Keybindings pressed while recording, replayed all at once by play_macro
+        self.macro: List[KeyBinding] = []
+        self.is_recording_macro: bool = False
+
         self.resized_img_rect: pg.Rect = None
         self.last_resized_img_rect: pg.Rect = None
 
@@ -67,68 +128,85 @@ class PyPixelArt:
         self.cursor_line_width: int = self.line_width // 2
         self.grid_line_width: int = 1
         self.symmetry_line_width: int = 4
-        self.command_controller: CommandController = CommandController()
+        self.command_controller: CommandController = CommandController(
+            history_limit=self.config.history_limit
+        )
 
         self.clock: pg.time.Clock = pg.time.Clock()
 
-        """
-        Get the biggest image dimension and take the inverse rule of 
-        three between the corresponding window dimension, 100 and the 
-        image dimension to get the appropriate zoom that keeps the 
-        image in the screen
-        """
-        if image.get_width() > image.get_height():
-            logging.debug(
-                f"Image width {image.get_width()} > image height {image.get_height()}"
-            )
-            initial_zoom_percent = (window_width * 100) // image.get_width()
-            logging.debug(f"Zoom initialized to {initial_zoom_percent}")
-        else:
-            logging.debug(
-                f"Image width {image.get_width()} <= image height {image.get_height()}"
-            )
-            initial_zoom_percent = (window_height * 100) // image.get_height()
-            logging.debug(f"Zoom initialized to {initial_zoom_percent}")
+        metrics.register_gauge(
+            "undo_depth", lambda: len(self.command_controller.undo_stack)
+        )
+        metrics.register_gauge(
+            "history_bytes",
+            lambda: estimate_bytes(
+                self.command_controller.undo_stack + self.command_controller.redo_stack,
+                canvas=self.image,
+            ),
+        )
+        metrics.register_cache("symmetry_map", get_symmetry_map)
 
-        # Percent of zoom space that must be left for the rest of the UI
+        # Percent of the window that must be left for the rest of the UI
         margin_percent = 20
 
-        # Remove margin_percent percent of the zoom value to leave room for the UI
-        initial_zoom_percent = (initial_zoom_percent * (100 - margin_percent)) // 100
-        logging.debug(
-            f"Changed initial zoom to {initial_zoom_percent} after removing the {margin_percent}% margin for the UI"
+        self.zoom: ZoomEngine = ZoomEngine(
+            image.get_size(),
+            (
+                window_width * (100 - margin_percent) // 100,
+                window_height * (100 - margin_percent) // 100,
+            ),
+            cache_size=self.config.zoom_cache_size,
         )
+        # The scaled levels only need the regions changed by each command scaled again
+        self.command_controller.listeners.append(self.update_zoom_levels)
+        metrics.register_cache("zoom_levels", self.zoom)
+
+        # Projects are saved with the cursor and zoom they were left at
+        if project is not None:
+            self.cursor_position = Point(*project.cursor)
+            if project.zoom_scale is not None:
+                self.zoom.set_scale(project.zoom_scale)
+            self.command_controller.listeners.append(
+                lambda command: project.mark_dirty(*command.dirty_rects())
+            )
+            # Commands must not change tiles that would then be overwritten when decoded
+            self.command_controller.before_execute.append(
+                lambda command: self.load_whole_image()
+            )
 
-        # Set the step to 5% of the zoom
-        zoom_step_percent = initial_zoom_percent // 20
-
-        # Set it to 1 if the result of the division above was 0
-        zoom_step_percent = 1 if zoom_step_percent == 0 else zoom_step_percent
-        logging.debug(f"Zoom step initialized to {zoom_step_percent}")
+        # Edits sent by other programs, applied once per frame
+        self.remote_server: "RemoteServer" = remote_server
 
-        self.zoom = {
-            "percent": initial_zoom_percent,
-            "step": zoom_step_percent,
-            "changed": False,
-        }
+        # Regions of the image changed since they were last written to the sidecar cache
+        self.sidecar_cache: "SidecarCache" = sidecar_cache
+        self.dirty_rects: List[pg.Rect] = []
+        if sidecar_cache is not None:
+            self.command_controller.listeners.append(
+                lambda command: self.dirty_rects.extend(command.dirty_rects())
+            )
 
         # Boolean variables checked in the run_loop method to determine which elements to draw in the screen
         self.is_drawing_grid = False
         self.is_drawing_color_selection = False
         self.is_drawing_bindings = False
+        self.is_drawing_tiled_preview = False
+        self.is_drawing_statistics = False
+
+        # Statistics of the image, only computed once they're first shown and then
+        # updated with the region changed by every command
+        self.stats: "ImageStats" = None
+        self._statistics_lines: tuple = ()
+        self._statistics_lines_key: tuple = None
+        self.command_controller.listeners.append(self.update_stats)
 
-        # Symmetry allows mirroring horizontally or vertically the changes done to the image
+        # Symmetry allows mirroring the changes done to the image, cycled through with the keybinding
         self.symmetry = SymmetryType.NoSymmetry
 
-        # The palette of colors seen in color selection
-        self.palette_colors = {
-            "red": pg.Color(172, 50, 50),
-            "cream": pg.Color(217, 160, 102),
-            "brown": pg.Color(102, 57, 49),
-            "black": pg.Color(0, 0, 0),
-            "blue": pg.Color(91, 110, 225),
-            "yellow": pg.Color(251, 242, 54),
-        }
+        # The palette of colors seen in color selection, which projects store with the image
+        self.project: "ProjectFile" = project
+        self.palette_colors = self.config.palette_colors(DEFAULT_PALETTE)
+        if project is not None and project.palette:
+            self.palette_colors = project.palette
 
         """ 
         Maps keycodes to the group they're displayed as on the help menu and 
@@ -137,9 +215,12 @@ class PyPixelArt:
         self.keybindings = [
             KeyBinding(pg.K_i, "Draw", self.draw_pixel),
             KeyBinding(pg.K_x, "Erase", self.erase_pixel),
-            KeyBinding(pg.K_u, "Undo", self.undo),
-            KeyBinding(pg.K_r, "Redo", self.redo),
-            KeyBinding(pg.K_w, "Save file", self.save),
+            KeyBinding(pg.K_u, "Undo", self.undo, recordable=False),
+            KeyBinding(pg.K_r, "Redo", self.redo, recordable=False),
+            KeyBinding(pg.K_w, "Save file", self.save, recordable=False),
+            KeyBinding(
+                pg.K_w, "Export PNG", self.export_png, shift=True, recordable=False
+            ),
             KeyBinding(pg.K_n, "Zoom", lambda: self.set_zoom(True), on_pressed=True),
             KeyBinding(pg.K_b, "Zoom", lambda: self.set_zoom(False), on_pressed=True),
             KeyBinding(pg.K_k, "Move cursor", lambda: self.move_cursor(0, -1)),
@@ -148,38 +229,83 @@ class PyPixelArt:
             KeyBinding(pg.K_h, "Move cursor", lambda: self.move_cursor(-1, 0)),
             KeyBinding(pg.K_g, "Grid", self.toggle_grid),
             KeyBinding(pg.K_s, "Symmetry", self.set_symmetry),
-            KeyBinding(pg.K_q, "Exit", sys.exit),
+            KeyBinding(pg.K_s, "Statistics", self.toggle_statistics, shift=True),
+            KeyBinding(pg.K_q, "Exit", sys.exit, recordable=False),
             KeyBinding(pg.K_c, "Color selection", self.toggle_color_selection),
+            KeyBinding(pg.K_m, "Mark", self.toggle_mark),
+            KeyBinding(pg.K_a, "Line", lambda: self.draw_shape(line_spans)),
+            KeyBinding(
+                pg.K_e,
+                "Rectangle",
+                lambda: self.draw_shape(rectangle_spans, can_fill=True),
+            ),
+            KeyBinding(
+                pg.K_o, "Ellipse", lambda: self.draw_shape(ellipse_spans, can_fill=True)
+            ),
+            KeyBinding(pg.K_t, "Fill shapes", self.toggle_shape_fill),
+            KeyBinding(pg.K_t, "Tiled preview", self.toggle_tiled_preview, shift=True),
+            KeyBinding(
+                pg.K_i, "Add cursor at mark", self.add_cursor_at_mark, shift=True
+            ),
+            KeyBinding(pg.K_g, "Stamp grid", self.set_stamp_grid, shift=True),
+            KeyBinding(pg.K_c, "Clear cursors", self.clear_cursor_set, shift=True),
+            KeyBinding(
+                pg.K_q,
+                "Record macro",
+                self.toggle_macro_recording,
+                shift=True,
+                recordable=False,
+            ),
+            KeyBinding(
+                pg.K_2, "Play macro", self.play_macro, shift=True, recordable=False
+            ),
+            KeyBinding(pg.K_v, "Select", self.toggle_selection),
+            KeyBinding(pg.K_y, "Copy", self.copy_selection),
+            KeyBinding(pg.K_d, "Cut", self.cut_selection),
+            KeyBinding(pg.K_p, "Paste", self.paste),
+            KeyBinding(pg.K_z, "Move selection", self.toggle_lift_selection),
+            KeyBinding(pg.K_f, "Flip", lambda: self.flip_selection(True, False)),
+            KeyBinding(
+                pg.K_f, "Flip", lambda: self.flip_selection(False, True), shift=True
+            ),
         ]
 
         """
-        Create a keybinding object for every color in the palette and assign a numeric
-        keycode starting from 1. Each number sets the current color to a color in the
-        palette.
+        Create a keybinding object for every color in a page of the palette and assign a
+        numeric keycode from 1 to 9 and then 0. Each number sets the current color to a
+        color in the page of the palette shown in color selection.
         """
+        self.palette_page: int = 0
         self.keybindings += [
             KeyBinding(
-                pg.key.key_code(str(i)),
+                pg.key.key_code(str((i + 1) % 10)),
                 "Color",
-                lambda c=color: self.set_cursor_color(c),
+                lambda i=i: self.select_palette_color(i),
             )
-            for i, (name, color) in enumerate(self.palette_colors.items(), start=1)
+            for i in range(min(PALETTE_PAGE_SIZE, len(self.palette_colors)))
+        ]
+        self.keybindings += [
+            KeyBinding(
+                pg.K_LEFTBRACKET, "Color page", lambda: self.set_palette_page(-1)
+            ),
+            KeyBinding(
+                pg.K_RIGHTBRACKET, "Color page", lambda: self.set_palette_page(1)
+            ),
         ]
 
-        self.help_keybinding = KeyBinding(pg.K_SPACE, "Help", self.toggle_show_bindings)
+        self.help_keybinding = KeyBinding(
+            pg.K_SPACE, "Help", self.toggle_show_bindings, recordable=False
+        )
 
         self.keybindings += [self.help_keybinding]
 
+        apply_bindings(self.keybindings, self.config.bindings)
+
     def set_zoom(self, is_positive_step: bool):
         """
-        Add one self.zoom["step"] percent of zoom if is_positive_step is True or subtract it
-        if is_positive_zoom is False
+        Zoom in one level if is_positive_step is True or out one level if it's False
         """
-        to_add = self.zoom["step"] if is_positive_step else -self.zoom["step"]
-        if self.zoom["percent"] + to_add > 0:
-            self.zoom["changed"] = True
-            self.zoom["percent"] += to_add
-            logging.debug(f"Zoom changed by {to_add} to {self.zoom['percent']}")
+        self.zoom.step(1 if is_positive_step else -1)
 
     def move_cursor(self, x: int, y: int):
         """
@@ -190,20 +316,66 @@ class PyPixelArt:
         new_x = (self.cursor_position.x + x) % self.image.get_width()
         new_y = (self.cursor_position.y + y) % self.image.get_height()
         self.cursor_position = Point(new_x, new_y)
-        logging.debug(f"Cursor position updated to ({new_x}, {new_y})")
+        logging.debug("Cursor position updated to (%d, %d)", new_x, new_y)
 
     def set_symmetry(self):
         self.symmetry = SymmetryType(
             (self.symmetry.value + 1) % len(list(SymmetryType))
         )
-        logging.debug(f"Symmetry set to {self.symmetry.name}")
+        logging.debug("Symmetry set to %s", self.symmetry.name)
 
     def toggle_grid(self):
         """
         Toggle value of is_drawing_grid to determine whether to draw the grid
         """
         self.is_drawing_grid = not self.is_drawing_grid
-        logging.debug(f"Grid set to {self.is_drawing_grid}")
+        logging.debug("Grid set to %s", self.is_drawing_grid)
+
+    def toggle_tiled_preview(self):
+        """
+        Toggle drawing copies of the image around it, to check that it tiles seamlessly
+        """
+        self.is_drawing_tiled_preview = not self.is_drawing_tiled_preview
+
+    def toggle_statistics(self):
+        """
+        Toggle showing the statistics of the image, computing them the first time
+        """
+        self.is_drawing_statistics = not self.is_drawing_statistics
+        if self.is_drawing_statistics and self.stats is None:
+            from pypixelart.analysis import ImageStats, load_reference
+
+            self.load_whole_image()
+            with metrics.timer("statistics_seconds"):
+                if self.project is not None and not self.project.dirty_tiles:
+                    # The project is still what's saved, so it's its own reference
+                    self.stats = ImageStats(self.image)
+                    self.stats.set_reference_to_image()
+                else:
+                    self.stats = ImageStats(self.image, load_reference(self.path))
+
+    def update_zoom_levels(self, command):
+        for rect in command.dirty_rects():
+            self.zoom.update_region(self.image, rect)
+
+    def update_stats(self, command):
+        if self.stats is not None:
+            for rect in command.dirty_rects():
+                self.stats.update(rect)
+
+    def statistics_lines(self) -> tuple:
+        """
+        Return the lines of text with the statistics, made again only when they change
+        """
+        key = self.stats.version, tuple(
+            (name, tuple(color)) for name, color in self.palette_colors.items()
+        )
+        if self._statistics_lines_key != key:
+            self._statistics_lines = tuple(
+                self.stats.summary_lines(self.palette_colors)
+            )
+            self._statistics_lines_key = key
+        return self._statistics_lines
 
     def toggle_color_selection(self):
         """
@@ -211,7 +383,7 @@ class PyPixelArt:
         the color selection menu
         """
         self.is_drawing_color_selection = not self.is_drawing_color_selection
-        logging.debug(f"Color selection set to {self.is_drawing_color_selection}")
+        logging.debug("Color selection set to %s", self.is_drawing_color_selection)
 
     def toggle_show_bindings(self):
         """
@@ -219,7 +391,25 @@ class PyPixelArt:
         the menu that shows the available keybindings
         """
         self.is_drawing_bindings = not self.is_drawing_bindings
-        logging.debug(f"Show bindings set to {self.is_drawing_bindings}")
+        logging.debug("Show bindings set to %s", self.is_drawing_bindings)
+
+    def select_palette_color(self, index: int):
+        """
+        Set the color used when drawing to the color at index of the current palette page
+        """
+        palette_index = self.palette_page * PALETTE_PAGE_SIZE + index
+        if palette_index < len(self.palette_colors):
+            self.set_cursor_color(list(self.palette_colors.values())[palette_index])
+
+    def set_palette_page(self, step: int):
+        """
+        Show the next page of the palette in color selection if step is positive or the
+        previous one if it's negative, wrapping around at the ends
+        """
+        pages = -(-len(self.palette_colors) // PALETTE_PAGE_SIZE)
+        self.palette_page = (self.palette_page + step) % pages
+        self.is_drawing_color_selection = True
+        logging.debug("Palette page set to %d of %d", self.palette_page + 1, pages)
 
     def set_cursor_color(self, selected_color: pg.Color):
         """
@@ -227,29 +417,304 @@ class PyPixelArt:
         """
         self.is_drawing_color_selection = False
         self.cursor_draw_color = selected_color
-        logging.debug(f"Cursor color set to {selected_color}")
+        logging.debug("Cursor color set to %s", selected_color)
 
     def draw_pixel(self):
         """
         Draw a pixel in the image using the selected position and color attributes
         """
-        draw_command = DrawPixelAtCursor(
-            self.image,
-            self.cursor_position.coordinates,
-            self.cursor_draw_color,
-            self.symmetry,
+        self.command_controller.execute(
+            self.draw_at_cursors_command(self.cursor_draw_color)
         )
-        self.command_controller.execute(draw_command)
 
     def erase_pixel(self):
         """
         Erase a pixel from the image using the selected position attributes.
         In other words, draw an ALPHA pixel at the position attribute.
         """
-        erase_command = DrawPixelAtCursor(
-            self.image, self.cursor_position.coordinates, ALPHA, self.symmetry
+        self.command_controller.execute(self.draw_at_cursors_command(ALPHA))
+
+    def draw_at_cursors_command(
+        self, color: pg.Color
+    ) -> Union[DrawPixelAtCursor, DrawPixels]:
+        """
+        Return the command that draws color at the main cursor and every cursor of the cursor set
+        """
+        if not self.cursor_set:
+            return DrawPixelAtCursor(
+                self.image, self.cursor_position.coordinates, color, self.symmetry
+            )
+        return DrawPixels(
+            self.image,
+            self.cursor_set.positions(
+                self.cursor_position.coordinates, self.image.get_size()
+            ),
+            color,
+            self.symmetry,
+        )
+
+    def add_cursor_at_mark(self):
+        """
+        Add a cursor at the marked position to the cursor set, which then moves together
+        with the main cursor, and remove the mark
+        """
+        if self.mark_position is None:
+            return
+
+        self.cursor_set.add(
+            (
+                self.mark_position.x - self.cursor_position.x,
+                self.mark_position.y - self.cursor_position.y,
+            )
+        )
+        self.mark_position = None
+        logging.debug("Cursor set has %d cursors", len(self.cursor_set))
+
+    def set_stamp_grid(self):
+        """
+        Replace the cursor set with a grid that repeats the cursor over the whole image,
+        spaced by the horizontal and vertical distance between the mark and the cursor
+        """
+        if self.mark_position is None:
+            return
+
+        try:
+            self.cursor_set.set_grid(
+                (
+                    abs(self.mark_position.x - self.cursor_position.x),
+                    abs(self.mark_position.y - self.cursor_position.y),
+                ),
+                self.image.get_size(),
+            )
+        except ValueError as e:
+            logging.warning("Stamp grid not set: %s", e)
+            return
+        self.mark_position = None
+        logging.debug("Cursor set has %d cursors", len(self.cursor_set))
+
+    def clear_cursor_set(self):
+        self.cursor_set.clear()
+
+    def cursor_set_overlay(self) -> Tuple[pg.Surface, Tuple[int, int]]:
+        """
+        Return a surface marking every cursor of the cursor set at the scale of the image,
+        and the position of the surface relative to the main cursor. The surface only covers
+        the cursors, and it's only drawn again when the cursor set or the zoom changes.
+        """
+        key = self.cursor_set.version, self.resized_img_rect.size
+        if self._cursor_set_overlay_key != key:
+            (width, height), (scaled_width, scaled_height) = (
+                self.image.get_size(),
+                self.resized_img_rect.size,
+            )
+            positions = self.cursor_set.offset_pairs()
+
+            # Scaled pixel x covers the screen pixels from scaled_x(x) to scaled_x(x + 1),
+            # the ones pg.transform.scale fills with it
+            def scaled_x(x: int) -> int:
+                return -(-x * scaled_width // width)
+
+            def scaled_y(y: int) -> int:
+                return -(-y * scaled_height // height)
+
+            xs = [x for x, _ in positions]
+            ys = [y for _, y in positions]
+            left, top = scaled_x(min(xs)), scaled_y(min(ys))
+            overlay = pg.Surface(
+                (scaled_x(max(xs) + 1) - left, scaled_y(max(ys) + 1) - top),
+                pg.SRCALPHA,
+            )
+            for x, y in positions:
+                marker_x, marker_y = scaled_x(x), scaled_y(y)
+                overlay.fill(
+                    CURSOR_SET_COLOR,
+                    (
+                        marker_x - left,
+                        marker_y - top,
+                        scaled_x(x + 1) - marker_x,
+                        scaled_y(y + 1) - marker_y,
+                    ),
+                )
+            self._cursor_set_overlay = overlay, (left, top)
+            self._cursor_set_overlay_key = key
+        return self._cursor_set_overlay
+
+    def draw_cursor_set(self):
+        """
+        Draw the markers of the cursor set around the main cursor, wrapping around the
+        edges of the scaled image like the cursors do
+        """
+        overlay, (left, top) = self.cursor_set_overlay()
+        rect = self.resized_img_rect
+        shift_x = self.cursor_position.x * rect.w // self.image.get_width() + left
+        shift_y = self.cursor_position.y * rect.h // self.image.get_height() + top
+
+        previous_clip = self.screen.get_clip()
+        self.screen.set_clip(rect)
+        # Offsets reach up to a whole image away, on either side of the main cursor
+        for x in (shift_x - rect.w, shift_x, shift_x + rect.w):
+            for y in (shift_y - rect.h, shift_y, shift_y + rect.h):
+                self.screen.blit(overlay, (rect.x + x, rect.y + y))
+        self.screen.set_clip(previous_clip)
+
+    def toggle_mark(self):
+        """
+        Mark the cursor position as the start of the next shape, or remove the mark if there is one
+        """
+        if self.mark_position is None:
+            self.mark_position = Point(*self.cursor_position.coordinates)
+        else:
+            self.mark_position = None
+        logging.debug("Mark set to %s", self.mark_position)
+
+    def toggle_shape_fill(self):
+        """
+        Toggle value of is_filling_shapes to determine whether rectangles and ellipses are filled
+        """
+        self.is_filling_shapes = not self.is_filling_shapes
+        logging.debug("Shape fill set to %s", self.is_filling_shapes)
+
+    def draw_shape(self, shape_spans, can_fill: bool = False):
+        """
+        Draw the shape between the mark and the cursor as a single command, then remove the mark.
+        shape_spans is the function that rasterizes the shape into spans.
+        Does nothing if no position is marked.
+        """
+        if self.mark_position is None:
+            return
+
+        corners = self.mark_position.coordinates, self.cursor_position.coordinates
+        spans = (
+            shape_spans(*corners, self.is_filling_shapes)
+            if can_fill
+            else shape_spans(*corners)
+        )
+        self.command_controller.execute(
+            DrawSpans(self.image, spans, self.cursor_draw_color, self.symmetry)
+        )
+        self.mark_position = None
+
+    @property
+    def selection_rect(self) -> pg.Rect:
+        """
+        Rect of the image between the selection anchor and the cursor, both included.
+        None if nothing is selected.
+        """
+        if self.selection_anchor is None:
+            return None
+
+        left, right = sorted((self.selection_anchor.x, self.cursor_position.x))
+        top, bottom = sorted((self.selection_anchor.y, self.cursor_position.y))
+        return pg.Rect(left, top, right - left + 1, bottom - top + 1)
+
+    def toggle_selection(self):
+        """
+        Start selecting from the cursor position, or stop selecting if there is a selection
+        """
+        if self.selection_anchor is None:
+            self.selection_anchor = Point(*self.cursor_position.coordinates)
+        else:
+            self.selection_anchor = None
+            self.lifted_selection = None
+        logging.debug("Selection anchor set to %s", self.selection_anchor)
+
+    def copy_selection(self):
+        """
+        Copy the selected pixels to the clipboard and stop selecting
+        """
+        selection_rect = self.selection_rect
+        if selection_rect is None:
+            return
+
+        self.load_whole_image()
+        self.clipboard = copy_region(self.image, selection_rect)
+        self.selection_anchor = None
+        logging.debug("Copied %s", selection_rect)
+
+    def cut_selection(self):
+        """
+        Copy the selected pixels to the clipboard and erase them from the image
+        """
+        selection_rect = self.selection_rect
+        if selection_rect is None:
+            return
+
+        self.copy_selection()
+        spans = rectangle_spans(
+            selection_rect.topleft,
+            (selection_rect.right - 1, selection_rect.bottom - 1),
+            filled=True,
+        )
+        self.command_controller.execute(
+            DrawSpans(self.image, spans, ALPHA, SymmetryType.NoSymmetry)
+        )
+
+    def paste(self):
+        """
+        Paste the clipboard with its top left corner at the cursor position
+        """
+        if self.clipboard is None:
+            return
+
+        self.command_controller.execute(
+            BlitRegion(self.image, self.clipboard, self.cursor_position.coordinates)
+        )
+
+    def toggle_lift_selection(self):
+        """
+        Lift the selection so that it follows the cursor, or drop the lifted selection
+        with its top left corner at the cursor position
+        """
+        if self.lifted_selection is None:
+            selection_rect = self.selection_rect
+            if selection_rect is None:
+                return
+
+            self.lifted_selection = selection_rect
+            self.selection_anchor = None
+            self.cursor_position = Point(*selection_rect.topleft)
+            logging.debug("Lifted selection %s", selection_rect)
+            return
+
+        if self.lifted_selection.topleft != self.cursor_position.coordinates:
+            self.command_controller.execute(
+                MoveRegion(
+                    self.image,
+                    self.lifted_selection,
+                    self.cursor_position.coordinates,
+                )
+            )
+        self.lifted_selection = None
+
+    def flip_selection(self, flip_x: bool, flip_y: bool):
+        """
+        Flip the selected pixels horizontally if flip_x is True and vertically if flip_y is True
+        """
+        selection_rect = self.selection_rect
+        if selection_rect is None:
+            return
+
+        # The flip reads straight from a view of the image, so only the flipped result is allocated
+        flipped = pg.transform.flip(
+            self.image.subsurface(selection_rect), flip_x, flip_y
+        )
+        self.command_controller.execute(
+            BlitRegion(self.image, flipped, selection_rect.topleft)
+        )
+
+    def image_to_screen_rect(self, rect: pg.Rect) -> pg.Rect:
+        """
+        Return where a rect of pixels of the image is shown in the screen
+        """
+        pixel_width = self.resized_img_rect.w / self.image.get_width()
+        pixel_height = self.resized_img_rect.h / self.image.get_height()
+        return pg.Rect(
+            (
+                pixel_width * rect.x + self.resized_img_rect.x,
+                pixel_height * rect.y + self.resized_img_rect.y,
+            ),
+            (pixel_width * rect.w, pixel_height * rect.h),
         )
-        self.command_controller.execute(erase_command)
 
     def undo(self):
         """
@@ -267,17 +732,86 @@ class PyPixelArt:
         """
         Save the image to the file in the path attribute
         """
-        pg.image.save(self.image, self.path)
+        self.load_whole_image()
+        with metrics.timer("save_seconds"):
+            if self.project is not None:
+                self.project.cursor = self.cursor_position.coordinates
+                self.project.zoom_scale = self.zoom.scale
+                self.project.palette = self.palette_colors
+                self.project.save()
+            else:
+                from pypixelart.png_stream import save_image
+
+                save_image(self.image, self.path)
         click.echo(f"Saved {self.path}")
 
+        if self.stats is not None:
+            self.stats.set_reference_to_image()
+
+        # Everything is in the saved file now, so there's nothing to recover
+        if self.sidecar_cache is not None:
+            self.sidecar_cache.close(delete=True)
+            self.dirty_rects.clear()
+
+    def toggle_macro_recording(self):
+        """
+        Start recording a new macro, or stop recording the current one
+        """
+        self.is_recording_macro = not self.is_recording_macro
+        if self.is_recording_macro:
+            self.macro = []
+        logging.debug(
+            "Macro recording set to %s with %d steps",
+            self.is_recording_macro,
+            len(self.macro),
+        )
+
+    def play_macro(self):
+        """
+        Call every keybinding of the recorded macro within this frame. Everything the
+        macro changes becomes a single undo entry, and the screen is only drawn again
+        once it has finished.
+        """
+        if self.is_recording_macro:
+            return
+
+        with metrics.timer("macro_seconds"):
+            with self.command_controller.grouped():
+                for binding in self.macro:
+                    binding.func()
+        logging.debug("Played macro with %d steps", len(self.macro))
+
+    def export_png(self):
+        """
+        Save the image as a PNG file next to the file in the path attribute
+        """
+        from pypixelart.png_stream import save_image
+
+        self.load_whole_image()
+        png_path = self.path.with_suffix(".png")
+        with metrics.timer("save_seconds"):
+            save_image(self.image, png_path)
+        click.echo(f"Exported {png_path}")
+
+    def load_whole_image(self):
+        """
+        Decode the tiles of the project that are still pending, for actions that read
+        or change pixels anywhere in the image. Until then, tiles are decoded a few
+        per frame and the cursor can move and zoom without waiting for them.
+        """
+        if self.project is not None and self.project.is_loading:
+            self.project.load_all()
+            self.zoom.invalidate()
+
     def handle_input(self):
         """
         Iterates over the list of Keybinding objects then for each of them, check if
         the keycode was pressed and call it's corresponding function
         """
         on_pressed_bindings = set(filter(lambda k: k.on_pressed, self.keybindings))
+        pressed_keys, mods = pg.key.get_pressed(), pg.key.get_mods()
         for binding in on_pressed_bindings:
-            if pg.key.get_pressed()[binding.keycode]:
+            if binding.is_held(pressed_keys, mods):
                 binding.func()
 
         not_on_pressed_keybindings = set(self.keybindings).difference(
@@ -288,95 +822,164 @@ class PyPixelArt:
                 sys.exit()
 
             for binding in not_on_pressed_keybindings:
-                if event.type == pg.KEYDOWN and event.key == binding.keycode:
+                if event.type == pg.KEYDOWN and binding.matches(event):
+                    if self.is_recording_macro and binding.recordable:
+                        self.macro.append(binding)
                     binding.func()
 
     def run_loop(self):
         logging.info("Running loop")
 
         while True:
-            self.screen.fill(GREY)
-
-            draw_header_text(
-                app_name=self.app_name,
-                path_name=self.path.name,
-                width=self.image.get_width(),
-                height=self.image.get_height(),
-                zoom=self.zoom["percent"],
-            )
+            self.run_frame()
+            self.clock.tick(self.config.fps)
 
-            self.last_resized_img_rect = self.resized_img_rect
+    def run_frame(self) -> float:
+        """
+        Handle the input and draw one frame on the screen.
+        Return how many seconds it took.
+        """
+        frame_start = time.perf_counter()
+        self.screen.fill(GREY)
+
+        draw_header_text(
+            app_name=self.app_name,
+            path_name=self.path.name,
+            width=self.image.get_width(),
+            height=self.image.get_height(),
+            zoom=self.zoom.percent,
+        )
 
-            # Sets a light grey color for the alpha background of the resized image
-            if self.resized_img_rect:
-                pg.draw.rect(
-                    pg.display.get_surface(),
-                    LIGHTER_GREY,
-                    self.resized_img_rect,
-                    border_radius=DEFAULT_BORDER_RADIUS,
-                )
+        self.last_resized_img_rect = self.resized_img_rect
 
-            self.resized_img, self.resized_img_rect = draw_scaled_image(
-                self.image, self.zoom["percent"]
+        # Sets a light grey color for the alpha background of the resized image
+        if self.resized_img_rect:
+            pg.draw.rect(
+                pg.display.get_surface(),
+                LIGHTER_GREY,
+                self.resized_img_rect,
+                border_radius=DEFAULT_BORDER_RADIUS,
             )
 
-            self.rectangle_rect = draw_rect_around_resized_img(
-                self.resized_img, self.resized_img_rect, self.line_width
-            )
+        # Decode some of the project's tiles every frame until it's fully loaded
+        if self.project is not None and self.project.is_loading:
+            for rect in self.project.load_tiles(budget_seconds=0.008):
+                self.zoom.update_region(self.image, rect)
+                if self.stats is not None:
+                    self.stats.update(rect)
+
+        self.zoom.update()
+        self.resized_img, self.resized_img_rect = draw_scaled_image(
+            self.zoom.surface(self.image)
+        )
+        if self.is_drawing_tiled_preview:
+            draw_tiled_image(self.resized_img, self.resized_img_rect)
 
-            cursor_width = self.resized_img_rect.w / self.image.get_rect().w
-            cursor_height = self.resized_img_rect.h / self.image.get_rect().h
-            cursor_rect_xy = (
-                cursor_width * self.cursor_position.x + self.resized_img_rect.x,
-                cursor_height * self.cursor_position.y + self.resized_img_rect.y,
+        self.rectangle_rect = draw_rect_around_resized_img(
+            self.resized_img, self.resized_img_rect, self.line_width
+        )
+
+        cursor_width = self.resized_img_rect.w / self.image.get_rect().w
+        cursor_height = self.resized_img_rect.h / self.image.get_rect().h
+        cursor_rect_xy = (
+            cursor_width * self.cursor_position.x + self.resized_img_rect.x,
+            cursor_height * self.cursor_position.y + self.resized_img_rect.y,
+        )
+        cursor_rect = (pg.Rect(cursor_rect_xy, (cursor_width, cursor_height)),)
+
+        # Zoomed out there are no whole screen pixels between the lines of the grid
+        if self.is_drawing_grid and self.zoom.scale >= 2:
+            where = self.resized_img.get_rect().move(
+                (self.resized_img_rect.x, self.resized_img_rect.y)
+            )
+            draw_grid(
+                where, (int(cursor_width), int(cursor_height)), self.grid_line_width
             )
-            cursor_rect = (pg.Rect(cursor_rect_xy, (cursor_width, cursor_height)),)
 
-            if self.is_drawing_grid:
-                where = self.resized_img.get_rect().move(
-                    (self.resized_img_rect.x, self.resized_img_rect.y)
-                )
-                draw_grid(
-                    where, (int(cursor_width), int(cursor_height)), self.grid_line_width
-                )
+        draw_symmetry_line(
+            self.symmetry,
+            self.resized_img.get_rect().move(
+                (self.resized_img_rect.x, self.resized_img_rect.y)
+            ),
+            self.symmetry_line_width,
+        )
 
-            draw_symmetry_line(
-                self.symmetry,
-                self.resized_img.get_rect().move(
-                    (self.resized_img_rect.x, self.resized_img_rect.y)
-                ),
-                self.symmetry_line_width,
+        if self.cursor_set:
+            self.draw_cursor_set()
+
+        if self.mark_position is not None:
+            mark_rect = self.image_to_screen_rect(
+                pg.Rect(self.mark_position.coordinates, (1, 1))
             )
+            pg.draw.rect(self.screen, RED, mark_rect, width=self.cursor_line_width)
 
-            cursor_image_color = BLACK if self.is_drawing_grid else WHITE
+        if self.selection_rect is not None:
             pg.draw.rect(
                 self.screen,
-                cursor_image_color,
-                cursor_rect,
+                RED,
+                self.image_to_screen_rect(self.selection_rect),
                 width=self.cursor_line_width,
             )
 
-            cursor_coords_text_rect = draw_cursor_coordinates(
-                self.cursor_position.coordinates, self.rectangle_rect.topleft
+        if self.lifted_selection is not None:
+            pg.draw.rect(
+                self.screen,
+                RED,
+                self.image_to_screen_rect(
+                    self.lifted_selection.move(
+                        self.cursor_position.x - self.lifted_selection.x,
+                        self.cursor_position.y - self.lifted_selection.y,
+                    )
+                ),
+                width=self.cursor_line_width,
             )
 
-            rect_top_right_corner_x, _ = self.rectangle_rect.topright
-            draw_selected_color(
-                self.cursor_draw_color,
-                rect_top_right_corner_x=rect_top_right_corner_x,
-                cursor_coord_text_y=cursor_coords_text_rect.y,
-            )
+        cursor_image_color = BLACK if self.is_drawing_grid else WHITE
+        pg.draw.rect(
+            self.screen,
+            cursor_image_color,
+            cursor_rect,
+            width=self.cursor_line_width,
+        )
 
-            self.handle_input()
+        cursor_coords_text_rect = draw_cursor_coordinates(
+            self.cursor_position.coordinates, self.rectangle_rect.topleft
+        )
 
-            if self.is_drawing_bindings:
-                draw_keybindings(self.keybindings, self.line_width)
-            else:
-                draw_help_keybind(self.help_keybinding, self.rectangle_rect)
+        rect_top_right_corner_x, _ = self.rectangle_rect.topright
+        draw_selected_color(
+            self.cursor_draw_color,
+            rect_top_right_corner_x=rect_top_right_corner_x,
+            cursor_coord_text_y=cursor_coords_text_rect.y,
+        )
+
+        self.handle_input()
+        if self.remote_server is not None:
+            self.remote_server.process(self)
+
+        if self.is_drawing_bindings:
+            draw_keybindings(self.keybindings, self.line_width)
+        else:
+            draw_help_keybind(self.help_keybinding, self.rectangle_rect)
+
+        if self.is_recording_macro:
+            draw_recording_indicator(self.rectangle_rect)
+
+        if self.is_drawing_statistics:
+            draw_statistics(self.statistics_lines(), self.line_width)
+
+        if self.is_drawing_color_selection:
+            draw_color_selection(
+                self.palette_colors, self.line_width, self.palette_page
+            )
 
-            if self.is_drawing_color_selection:
-                draw_color_selection(self.palette_colors, self.line_width)
+        pg.display.flip()
 
-            pg.display.flip()
+        if self.dirty_rects:
+            self.sidecar_cache.write_rects(self.image, self.dirty_rects)
+            self.dirty_rects.clear()
 
-            self.clock.tick(60)
+        # Time spent drawing the frame, without the wait to cap the frame rate
+        frame_seconds = time.perf_counter() - frame_start
+        metrics.observe("frame_seconds", frame_seconds)
+        return frame_seconds
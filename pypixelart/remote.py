@@ -0,0 +1,224 @@
+import asyncio
+import base64
+import binascii
+import concurrent.futures
+import json
+import logging
+import pathlib
+import queue
+import threading
+from typing import Callable, List, Tuple
+
+import pygame as pg
+
+from pypixelart.command import Command
+from pypixelart.command.commands import BlitRegion, DrawPixels, DrawSpans
+from pypixelart.shapes import rectangle_spans
+from pypixelart.symmetry_type import SymmetryType
+
+# Longest message accepted, big enough for a batch with the pixels of a large sprite
+MESSAGE_LIMIT = 64 * 1024 * 1024
+
+# Batches waiting for the main thread, with the future their reply is sent through
+PendingBatch = Tuple[List[dict], concurrent.futures.Future]
+
+
+class RemoteServer:
+    """
+    Local server that lets other programs edit the image of a running editor.
+
+    Clients send one JSON message per line, either a single operation or a list of them
+    that is applied as a batch, and get one JSON line back for every message:
+    {"ok": true} or {"error": "..."}. The operations are:
+
+    - {"op": "set_pixels", "color": [r, g, b, a], "positions": [[x, y], ...]}
+    - {"op": "fill_rect", "color": [r, g, b, a], "rect": [x, y, w, h]}
+    - {"op": "blit", "rect": [x, y, w, h], "rgba": "<base64 RGBA bytes>"}
+    - {"op": "undo"}, {"op": "redo"} and {"op": "save"}
+
+    The server runs an asyncio loop in a background thread, which only parses messages
+    and queues them. The image is only touched by process, which the main loop calls
+    once per frame, so every edit of a message is executed there and consecutive edits
+    become a single undo entry.
+
+    The address is a path for a Unix socket, or host:port for a TCP socket.
+    """
+
+    def __init__(self, address: str):
+        self.address: str = address
+        self.pending: "queue.Queue[PendingBatch]" = queue.Queue()
+        self._loop: asyncio.AbstractEventLoop = None
+        self._server: asyncio.AbstractServer = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="pypixelart-remote", daemon=True
+        )
+
+    @property
+    def is_unix_socket(self) -> bool:
+        return ":" not in self.address
+
+    def start(self) -> None:
+        """
+        Start listening in the background thread, returning once the socket is open
+        """
+        self._thread.start()
+        self._started.wait()
+        if self._server is None:
+            raise OSError(f"Couldn't listen on {self.address}")
+        logging.info("Remote server listening on %s", self.address)
+
+    def close(self) -> None:
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self.is_unix_socket:
+            pathlib.Path(self.address).unlink(missing_ok=True)
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._server = self._loop.run_until_complete(self._listen())
+        except OSError:
+            logging.exception("Remote server couldn't listen on %s", self.address)
+            return
+        finally:
+            self._started.set()
+        self._loop.run_forever()
+
+    async def _listen(self) -> asyncio.AbstractServer:
+        if self.is_unix_socket:
+            return await asyncio.start_unix_server(
+                self._handle_client, self.address, limit=MESSAGE_LIMIT
+            )
+        host, port = self.address.rsplit(":", 1)
+        return await asyncio.start_server(
+            self._handle_client, host or "127.0.0.1", int(port), limit=MESSAGE_LIMIT
+        )
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while line := await reader.readline():
+                reply = await self._reply_to(line)
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            logging.info("Remote client disconnected: %s", e)
+        finally:
+            writer.close()
+
+    async def _reply_to(self, line: bytes) -> dict:
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError as e:
+            return {"error": f"invalid JSON: {e}"}
+        batch = message if isinstance(message, list) else [message]
+        if not all(isinstance(operation, dict) for operation in batch):
+            return {"error": "operations must be JSON objects"}
+
+        future = concurrent.futures.Future()
+        self.pending.put((batch, future))
+        return await asyncio.wrap_future(future)
+
+    def process(self, app) -> None:
+        """
+        Apply every batch received since the last call to app. Called by the main loop.
+        """
+        while True:
+            try:
+                batch, future = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                apply_batch(app, batch)
+            except (KeyError, TypeError, ValueError) as e:
+                future.set_result({"error": str(e) or type(e).__name__})
+            except OSError as e:
+                logging.warning("Remote batch failed: %s", e)
+                future.set_result({"error": f"couldn't save: {e.strerror or e}"})
+            except pg.error as e:
+                # pygame reports failed saves of small images with its own error
+                logging.warning("Remote batch failed: %s", e)
+                future.set_result({"error": f"couldn't save: {e}"})
+            else:
+                future.set_result({"ok": True})
+
+
+def apply_batch(app, batch: List[dict]) -> None:
+    """
+    Check every operation of batch and then apply them to app. Edits that come one after
+    another are executed as a group, so they're undone together.
+
+    Raise ValueError, KeyError or TypeError without changing anything if an operation
+    is invalid, and OSError or pg.error if saving fails.
+    """
+    image = app.image
+    actions: List[Callable[[], None]] = []
+    edits: List[Command] = []
+
+    def flush_edits() -> None:
+        if edits:
+            group = list(edits)
+            actions.append(lambda: execute_grouped(app, group))
+            edits.clear()
+
+    for operation in batch:
+        op = operation["op"]
+        if op == "set_pixels":
+            positions = [tuple(map(int, p)) for p in operation["positions"]]
+            for position in positions:
+                if not image.get_rect().collidepoint(position):
+                    raise ValueError(f"position {position} is outside of the image")
+            if positions:
+                edits.append(
+                    DrawPixels(
+                        image,
+                        positions,
+                        pg.Color(*operation["color"]),
+                        SymmetryType.NoSymmetry,
+                    )
+                )
+        elif op == "fill_rect":
+            rect = pg.Rect(operation["rect"]).clip(image.get_rect())
+            if rect.w and rect.h:
+                edits.append(
+                    DrawSpans(
+                        image,
+                        rectangle_spans(
+                            rect.topleft, (rect.right - 1, rect.bottom - 1), True
+                        ),
+                        pg.Color(*operation["color"]),
+                        SymmetryType.NoSymmetry,
+                    )
+                )
+        elif op == "blit":
+            rect = pg.Rect(operation["rect"])
+            if not rect.w or not rect.h or not image.get_rect().contains(rect):
+                raise ValueError(f"rect {rect} isn't inside the image")
+            try:
+                pixels = base64.b64decode(operation["rgba"], validate=True)
+            except binascii.Error as e:
+                raise ValueError(f"invalid base64 pixels: {e}") from e
+            if len(pixels) != rect.w * rect.h * 4:
+                raise ValueError(f"expected {rect.w * rect.h * 4} bytes of RGBA pixels")
+            source = pg.image.frombuffer(pixels, rect.size, "RGBA").copy()
+            edits.append(BlitRegion(image, source, rect.topleft))
+        elif op in ("undo", "redo", "save"):
+            flush_edits()
+            actions.append(getattr(app, op))
+        else:
+            raise ValueError(f"unknown operation {op!r}")
+    flush_edits()
+
+    for action in actions:
+        action()
+
+
+def execute_grouped(app, commands: List[Command]) -> None:
+    if len(commands) == 1:
+        app.command_controller.execute(commands[0])
+        return
+    with app.command_controller.grouped():
+        for command in commands:
+            app.command_controller.execute(command)
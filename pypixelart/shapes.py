@@ -0,0 +1,149 @@
+from typing import Dict, Iterable, List, Tuple
+
+# A span is a horizontal run of pixels (x_start, x_end, y), with both ends included.
+# Shapes are rasterized into spans so they can be drawn with one fill per span
+# instead of one set_at per pixel.
+Span = Tuple[int, int, int]
+
+
+def points_to_spans(points: Iterable[Tuple[int, int]], filled: bool) -> List[Span]:
+    """
+    Group points by row into spans. If filled is True, each row becomes a single span
+    from its leftmost to its rightmost point, otherwise only consecutive points are merged.
+    """
+    rows: Dict[int, List[int]] = {}
+    for x, y in points:
+        rows.setdefault(y, []).append(x)
+
+    spans = []
+    for y in sorted(rows):
+        xs = sorted(set(rows[y]))
+        if filled:
+            spans.append((xs[0], xs[-1], y))
+            continue
+
+        start = previous = xs[0]
+        for x in xs[1:]:
+            if x != previous + 1:
+                spans.append((start, previous, y))
+                start = x
+            previous = x
+        spans.append((start, previous, y))
+
+    return spans
+
+
+def line_points(start: Tuple[int, int], end: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """
+    Return the points of the line between start and end, using Bresenham's line algorithm
+    """
+    x0, y0 = start
+    x1, y1 = end
+    dx, dy = abs(x1 - x0), -abs(y1 - y0)
+    step_x = 1 if x0 < x1 else -1
+    step_y = 1 if y0 < y1 else -1
+    err = dx + dy
+
+    points = []
+    while True:
+        points.append((x0, y0))
+        if x0 == x1 and y0 == y1:
+            return points
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            x0 += step_x
+        if e2 <= dx:
+            err += dx
+            y0 += step_y
+
+
+def ellipse_points(
+    start: Tuple[int, int], end: Tuple[int, int]
+) -> List[Tuple[int, int]]:
+    """
+    Return the points of the outline of the ellipse inscribed in the rectangle with
+    corners start and end, using the midpoint ellipse algorithm. It works one quadrant
+    at a time from the rectangle's sides, so rectangles with an even width or height,
+    whose center is between two pixels, are handled too.
+    """
+    x0, y0 = start
+    x1, y1 = end
+    a, b = abs(x1 - x0), abs(y1 - y0)
+    b1 = b & 1
+    dx = 4 * (1 - a) * b * b
+    dy = 4 * (b1 + 1) * a * a
+    err = dx + dy + b1 * a * a
+
+    if x0 > x1:
+        x0 = x1
+        x1 += a
+    if y0 > y1:
+        y0 = y1
+    y0 += (b + 1) // 2
+    y1 = y0 - b1
+    a *= 8 * a
+    b1 = 8 * b * b
+
+    points = []
+    while True:
+        points += [(x1, y0), (x0, y0), (x0, y1), (x1, y1)]
+        e2 = 2 * err
+        if e2 <= dy:
+            y0 += 1
+            y1 -= 1
+            dy += a
+            err += dy
+        if e2 >= dx or 2 * err > dy:
+            x0 += 1
+            x1 -= 1
+            dx += b1
+            err += dx
+        if x0 > x1:
+            break
+
+    # Flat ellipses stop before reaching the tips, finish them
+    while y0 - y1 <= b:
+        points += [(x0 - 1, y0), (x1 + 1, y0)]
+        y0 += 1
+        points += [(x0 - 1, y1), (x1 + 1, y1)]
+        y1 -= 1
+
+    return points
+
+
+def line_spans(start: Tuple[int, int], end: Tuple[int, int]) -> List[Span]:
+    """
+    Return the spans of the line between start and end
+    """
+    return points_to_spans(line_points(start, end), filled=False)
+
+
+def rectangle_spans(
+    start: Tuple[int, int], end: Tuple[int, int], filled: bool
+) -> List[Span]:
+    """
+    Return the spans of the rectangle with corners start and end
+    """
+    left, right = sorted((start[0], end[0]))
+    top, bottom = sorted((start[1], end[1]))
+
+    if filled or bottom - top < 2:
+        return [(left, right, y) for y in range(top, bottom + 1)]
+
+    spans = [(left, right, top)]
+    for y in range(top + 1, bottom):
+        spans.append((left, left, y))
+        if right != left:
+            spans.append((right, right, y))
+    spans.append((left, right, bottom))
+    return spans
+
+
+def ellipse_spans(
+    start: Tuple[int, int], end: Tuple[int, int], filled: bool
+) -> List[Span]:
+    """
+    Return the spans of the ellipse inscribed in the rectangle with corners start and end
+    """
+    return points_to_spans(ellipse_points(start, end), filled)
@@ -0,0 +1,131 @@
+import logging
+import mmap
+import pathlib
+import struct
+from typing import Iterable, Tuple
+
+import pygame as pg
+
+from pypixelart.png_stream import rows_per_strip
+
+SIDECAR_MAGIC = b"PPACACHE"
+# magic, width, height, and the modification time in nanoseconds and size of the image
+# file when the sidecar was created, both 0 if the image wasn't saved yet
+SIDECAR_HEADER = struct.Struct(">8sIIQQ")
+
+
+class SidecarCache:
+    """
+    Uncompressed copy of the image kept in a memory-mapped file next to it while editing.
+    Only the regions changed since the last write are copied into it, so unsaved work can
+    be recovered without encoding the whole image. The PNG itself is only encoded on save.
+
+    The file starts with a header with a magic string, the width, the height and the
+    modification time and size of the image file, followed by the RGBA bytes of every row.
+    Sidecars of an image file that changed since are stale and aren't recovered.
+    """
+
+    def __init__(self, image_path: pathlib.Path):
+        self.image_path: pathlib.Path = image_path
+        self.path: pathlib.Path = image_path.with_name(image_path.name + ".cache")
+        self._file = None
+        self._map: mmap.mmap = None
+        self._width: int = 0
+
+    def open(self, image: pg.Surface) -> None:
+        """
+        Create the sidecar file with every pixel of image
+        """
+        width, height = image.get_size()
+        self._width = width
+        self._file = open(self.path, "w+b")
+        self._file.truncate(SIDECAR_HEADER.size + width * height * 4)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map[: SIDECAR_HEADER.size] = SIDECAR_HEADER.pack(
+            SIDECAR_MAGIC, width, height, *self.image_stamp()
+        )
+        self.write_rects(image, [image.get_rect()])
+        logging.info("Created sidecar cache %s", self.path)
+
+    def image_stamp(self) -> Tuple[int, int]:
+        """
+        Return the modification time in nanoseconds and the size of the image file,
+        or zeros if it doesn't exist
+        """
+        try:
+            stat = self.image_path.stat()
+        except FileNotFoundError:
+            return 0, 0
+        return stat.st_mtime_ns, stat.st_size
+
+    def write_rects(self, image: pg.Surface, rects: Iterable[pg.Rect]) -> None:
+        """
+        Copy the pixels of image inside rects to the sidecar, opening it first if needed
+        """
+        if self._map is None:
+            self.open(image)
+            return
+
+        row_stride = self._width * 4
+        for rect in rects:
+            rect = rect.clip(image.get_rect())
+            if not rect.w or not rect.h:
+                continue
+
+            pixels = pg.image.tostring(image.subsurface(rect), "RGBA")
+            rect_row_bytes = rect.w * 4
+            for row in range(rect.h):
+                offset = SIDECAR_HEADER.size + (rect.y + row) * row_stride + rect.x * 4
+                self._map[offset : offset + rect_row_bytes] = pixels[
+                    row * rect_row_bytes : (row + 1) * rect_row_bytes
+                ]
+        self._map.flush()
+
+    def close(self, delete: bool = False) -> None:
+        """
+        Unmap and close the sidecar file, deleting it if delete is True
+        """
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+        if delete:
+            self.path.unlink(missing_ok=True)
+
+    def load(self) -> pg.Surface:
+        """
+        Return the image stored in an existing sidecar file, or None if there is no valid one
+        """
+        if not self.path.is_file():
+            return None
+
+        with open(self.path, "rb") as file:
+            header = file.read(SIDECAR_HEADER.size)
+            if len(header) < SIDECAR_HEADER.size:
+                return None
+            magic, width, height, *image_stamp = SIDECAR_HEADER.unpack(header)
+            if magic != SIDECAR_MAGIC or self.path.stat().st_size != (
+                SIDECAR_HEADER.size + width * height * 4
+            ):
+                return None
+            if tuple(image_stamp) != self.image_stamp():
+                logging.warning(
+                    "Ignoring sidecar cache %s, %s changed after it was written",
+                    self.path,
+                    self.image_path,
+                )
+                return None
+
+            image = pg.Surface((width, height), pg.SRCALPHA)
+            strip_height = rows_per_strip(width * 4)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as pixels:
+                for y in range(0, height, strip_height):
+                    rows = min(strip_height, height - y)
+                    start = SIDECAR_HEADER.size + y * width * 4
+                    rows_surface = pg.image.frombuffer(
+                        pixels[start : start + rows * width * 4], (width, rows), "RGBA"
+                    )
+                    # Adding onto a transparent surface copies the pixels exactly
+                    image.blit(rows_surface, (0, y), special_flags=pg.BLEND_RGBA_ADD)
+
+        return image
@@ -0,0 +1,43 @@
+import contextlib
+import time
+from typing import List, Tuple
+
+
+class StartupTrace:
+    """
+    Record how long each import and initialization step takes during startup,
+    so that the breakdown can be printed with the --startup-trace flag
+    """
+
+    def __init__(self, start: float = None):
+        self.start: float = time.perf_counter() if start is None else start
+        self.steps: List[Tuple[str, float]] = []
+
+    @contextlib.contextmanager
+    def step(self, name: str):
+        """
+        Time the code executed inside the with block and record it under name
+        """
+        step_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - step_start))
+
+    def add(self, name: str, step_start: float) -> None:
+        """
+        Record a step that started at step_start and ended now
+        """
+        self.steps.append((name, time.perf_counter() - step_start))
+
+    def report(self) -> str:
+        """
+        Return a table with the duration of every step in milliseconds and the total time since start
+        """
+        width = max((len(name) for name, _ in self.steps), default=0)
+        lines = [
+            f"{name:<{width}}  {seconds * 1000:8.2f} ms" for name, seconds in self.steps
+        ]
+        total = (time.perf_counter() - self.start) * 1000
+        lines.append(f"{'total':<{width}}  {total:8.2f} ms")
+        return "\n".join(lines)
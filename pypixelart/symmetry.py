@@ -0,0 +1,125 @@
+import functools
+from typing import Iterable, List, Tuple
+
+import pygame as pg
+
+from pypixelart.symmetry_type import SymmetryType
+
+
+class SymmetryMap:
+    """
+    Mirror coordinate tables for an image size, computed once so drawing doesn't
+    have to recalculate the middle of the image for every pixel.
+
+    For a coordinate (x, y) in an image of width and height (w, h), the vertically
+    symmetric pixel is (w - 1 - x, y) and the horizontally symmetric pixel is
+    (x, h - 1 - y), where 1 is subtracted to account for 0-indexing. Quad symmetry
+    combines both, which also adds the pixel in the opposite corner, and rotational
+    symmetry keeps only the opposite corner (w - 1 - x, h - 1 - y).
+
+    Diagonal symmetry swaps the coordinates, giving (y, x). On images that aren't
+    square the swapped pixel can fall outside of the image, in which case it's skipped.
+    """
+
+    def __init__(self, size: Tuple[int, int]):
+        self.width, self.height = size
+        self.mirrored_x: Tuple[int, ...] = tuple(range(self.width - 1, -1, -1))
+        self.mirrored_y: Tuple[int, ...] = tuple(range(self.height - 1, -1, -1))
+
+    def positions(
+        self, position: Tuple[int, int], symmetry_type: SymmetryType
+    ) -> Tuple[Tuple[int, int], ...]:
+        """
+        Return position followed by its symmetric positions for the symmetry type,
+        without duplicates
+        """
+        x, y = position
+
+        if symmetry_type is SymmetryType.NoSymmetry:
+            return (position,)
+
+        elif symmetry_type is SymmetryType.Vertical:
+            mirrored = ((self.mirrored_x[x], y),)
+
+        elif symmetry_type is SymmetryType.Horizontal:
+            mirrored = ((x, self.mirrored_y[y]),)
+
+        elif symmetry_type is SymmetryType.Quad:
+            mirror_x, mirror_y = self.mirrored_x[x], self.mirrored_y[y]
+            mirrored = ((mirror_x, y), (x, mirror_y), (mirror_x, mirror_y))
+
+        elif symmetry_type is SymmetryType.Rotational:
+            mirrored = ((self.mirrored_x[x], self.mirrored_y[y]),)
+
+        elif symmetry_type is SymmetryType.Diagonal:
+            if y >= self.width or x >= self.height:
+                return (position,)
+            mirrored = ((y, x),)
+
+        else:
+            raise ValueError(f"Unknown symmetry type {symmetry_type}")
+
+        return tuple(dict.fromkeys((position,) + mirrored))
+
+    def stroke_positions(
+        self, positions: Iterable[Tuple[int, int]], symmetry_type: SymmetryType
+    ) -> List[Tuple[int, int]]:
+        """
+        Return every position of a stroke together with all of their symmetric positions,
+        without duplicates and in the order they were first reached
+        """
+        if symmetry_type is SymmetryType.NoSymmetry:
+            return list(dict.fromkeys(positions))
+
+        stroke = {}
+        for position in positions:
+            stroke.update(dict.fromkeys(self.positions(position, symmetry_type)))
+        return list(stroke)
+
+    def rects(self, rect: pg.Rect, symmetry_type: SymmetryType) -> List[pg.Rect]:
+        """
+        Return rect followed by its symmetric rects for the symmetry type, without duplicates.
+        The symmetric rects use the same mirroring as positions, applied to the rect's corners.
+        """
+        mirrored_x = self.width - rect.right
+        mirrored_y = self.height - rect.bottom
+
+        if symmetry_type is SymmetryType.NoSymmetry:
+            return [rect]
+
+        elif symmetry_type is SymmetryType.Vertical:
+            mirrored = [pg.Rect(mirrored_x, rect.y, rect.w, rect.h)]
+
+        elif symmetry_type is SymmetryType.Horizontal:
+            mirrored = [pg.Rect(rect.x, mirrored_y, rect.w, rect.h)]
+
+        elif symmetry_type is SymmetryType.Quad:
+            mirrored = [
+                pg.Rect(mirrored_x, rect.y, rect.w, rect.h),
+                pg.Rect(rect.x, mirrored_y, rect.w, rect.h),
+                pg.Rect(mirrored_x, mirrored_y, rect.w, rect.h),
+            ]
+
+        elif symmetry_type is SymmetryType.Rotational:
+            mirrored = [pg.Rect(mirrored_x, mirrored_y, rect.w, rect.h)]
+
+        elif symmetry_type is SymmetryType.Diagonal:
+            # Parts that fall outside of non-square images get clipped when drawn
+            mirrored = [pg.Rect(rect.y, rect.x, rect.h, rect.w)]
+
+        else:
+            raise ValueError(f"Unknown symmetry type {symmetry_type}")
+
+        rects = [rect]
+        for mirrored_rect in mirrored:
+            if mirrored_rect not in rects:
+                rects.append(mirrored_rect)
+        return rects
+
+
+@functools.lru_cache(maxsize=4)
+def get_symmetry_map(size: Tuple[int, int]) -> SymmetryMap:
+    """
+    Return the SymmetryMap for an image size, building it only the first time the size is used
+    """
+    return SymmetryMap(size)
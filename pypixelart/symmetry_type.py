@@ -5,9 +5,9 @@ class SymmetryType(enum.IntEnum):
     """
     Determines whether to and how to mirror changes done to the image.
 
-    A more in-depth technical explanation of how the symmetric pixel
-    is defined is available in the documentation for the draw_pixel
-    function.
+    A more in-depth technical explanation of how the symmetric pixels
+    are defined is available in the documentation for the SymmetryMap
+    class.
 
     The enum values are kept as manually assigned integers starting
     from 0 to ensure they work when used to calculate the next
@@ -20,3 +20,9 @@ class SymmetryType(enum.IntEnum):
     Horizontal = 1
     # changes are mirrored vertically
     Vertical = 2
+    # changes are mirrored horizontally, vertically and to the opposite corner
+    Quad = 3
+    # changes are mirrored across the diagonal that starts at the top left corner
+    Diagonal = 4
+    # changes are rotated 180 degrees around the center of the image
+    Rotational = 5
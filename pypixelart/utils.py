@@ -1,12 +1,15 @@
+import functools
 import itertools
 import sys
 from pathlib import Path
-from typing import Union, Iterable, Tuple
+from typing import Union, Iterable, Tuple, List
 
 import pygame as pg
 
 from pypixelart.constants import *
 from pypixelart.keybinding import KeyBinding
+from pypixelart.shapes import Span
+from pypixelart.symmetry import get_symmetry_map
 from pypixelart.symmetry_type import SymmetryType
 
 
@@ -55,35 +58,54 @@ def draw_selected_color(
     )
 
 
-def draw_color_selection(palette_colors: dict, line_width: int):
+def draw_color_selection(palette_colors: dict, line_width: int, page: int = 0):
     """
-    Draw in pygame's display surface a window showing all the colors available in the palette
-    and each of their corresponding keybindings
+    Draw in pygame's display surface a window showing the colors available in the palette,
+    in rows of PALETTE_PAGE_SIZE colors. The row of the selected page shows the keybinding
+    of each color, and the rows scroll so it's always visible.
     """
     screen = pg.display.get_surface()
     palette_rect = pg.Rect((0, 0), (screen.get_width() // 2, screen.get_height() // 2))
     palette_surface = pg.Surface((palette_rect.w, palette_rect.h))
     palette_surface.fill(BLACK)
 
-    for i, name_color in enumerate(palette_colors.items(), start=1):
-        name, color = name_color
-        color_surface = pg.Surface((palette_rect.w // 10, palette_rect.h // 10))
-        color_surface_rect = color_surface.get_rect()
-        (
-            color_surface_center_x,
-            color_surface_center_y,
-        ) = color_surface_rect.center
-        pg.draw.rect(
-            color_surface,
-            color,
-            color_surface_rect,
-            border_radius=DEFAULT_BORDER_RADIUS,
+    # Tiny windows still get swatches a pixel high, so the rows can be counted
+    swatch_size = palette_rect.w // PALETTE_PAGE_SIZE, max(1, palette_rect.h // 10)
+    colors = list(palette_colors.values())
+    pages = -(-len(colors) // PALETTE_PAGE_SIZE)
+    # The last row is left for the page number
+    visible_rows = palette_rect.h // swatch_size[1] - 1
+    first_row = max(0, min(page - visible_rows + 1, pages - visible_rows))
+
+    for row in range(first_row, min(pages, first_row + visible_rows)):
+        row_y = (row - first_row) * swatch_size[1]
+        for column, color in enumerate(
+            colors[row * PALETTE_PAGE_SIZE : (row + 1) * PALETTE_PAGE_SIZE]
+        ):
+            color_surface_rect = pg.Rect((column * swatch_size[0], row_y), swatch_size)
+            pg.draw.rect(
+                palette_surface,
+                color,
+                color_surface_rect,
+                border_radius=DEFAULT_BORDER_RADIUS,
+            )
+            if row == page:
+                color_binding_text = new_text_surface(
+                    str((column + 1) % 10), color=~color
+                )
+                palette_surface.blit(
+                    color_binding_text,
+                    color_binding_text.get_rect(center=color_surface_rect.center),
+                )
+
+    if pages > 1:
+        page_text = new_text_surface(f"Page {page + 1}/{pages}: [ and ]", color=WHITE)
+        palette_surface.blit(
+            page_text,
+            page_text.get_rect(
+                midbottom=(palette_rect.centerx, palette_rect.bottom - line_width)
+            ),
         )
-        color_binding_text = new_text_surface(str(i), color=~color)
-        center_x = color_surface_center_x - color_binding_text.get_width() // 2
-        center_y = color_surface_center_y - color_binding_text.get_height() // 2
-        color_surface.blit(color_binding_text, (center_x, center_y))
-        palette_surface.blit(color_surface, ((i - 1) * color_surface_rect.w, 0))
 
     pg.draw.rect(
         palette_surface,
@@ -112,12 +134,11 @@ def draw_color_selection(palette_colors: dict, line_width: int):
     blit_text_to_screen(selection_title_surface, selection_title_rect)
 
 
-def draw_scaled_image(image: pg.Surface, percent: int) -> Tuple[pg.Surface, pg.Rect]:
+def draw_scaled_image(scaled_img: pg.Surface) -> Tuple[pg.Surface, pg.Rect]:
     """
-    Draw in pygame's display surface the image scaled to the specified percentage.
+    Draw in pygame's display surface the already scaled image, centered.
     Return the scaled surface and it's Rect object.
     """
-    scaled_img = scale_surface(image, percent)
     scaled_img_rect = pg.Rect(
         rect_screen_center(scaled_img.get_rect(), center_x=True, center_y=True),
         (scaled_img.get_width(), scaled_img.get_height()),
@@ -126,29 +147,49 @@ def draw_scaled_image(image: pg.Surface, percent: int) -> Tuple[pg.Surface, pg.R
     return scaled_img, scaled_img_rect
 
 
+def draw_tiled_image(scaled_img: pg.Surface, scaled_img_rect: pg.Rect):
+    """
+    Draw in pygame's display surface the already scaled image repeated 3x3 around
+    scaled_img_rect, like it would look when used as a tiling texture.
+    Every copy is a blit of the same surface, so nothing is scaled again.
+    """
+    display = pg.display.get_surface()
+    for row, column in itertools.product((-1, 0, 1), repeat=2):
+        if row or column:
+            copy_rect = scaled_img_rect.move(
+                column * scaled_img_rect.w, row * scaled_img_rect.h
+            )
+            pg.draw.rect(display, LIGHTER_GREY, copy_rect)
+            display.blit(scaled_img, copy_rect)
+
+
 def draw_symmetry_line(sym_type: SymmetryType, rect: pg.Rect, line_width: int):
     """
-    Draw in pygame's display surface a line separating the middle of the image
-    vertically or horizontally depending on the symmetry type, to indicate to
-    the user how the symmetry is getting applied.
+    Draw in pygame's display surface the lines or point the image is mirrored across,
+    depending on the symmetry type, to indicate to the user how the symmetry is getting
+    applied.
     """
     if sym_type == SymmetryType.NoSymmetry:
         return
 
-    start_x, start_y = (
-        rect.midtop if sym_type == SymmetryType.Vertical else rect.midleft
-    )
-    end_x, end_y = (
-        rect.midbottom if sym_type == SymmetryType.Vertical else rect.midright
-    )
+    surface = pg.display.get_surface()
+    lines = []
 
-    pg.draw.line(
-        pg.display.get_surface(),
-        BLACK,
-        (start_x, start_y),
-        (end_x, end_y),
-        width=line_width,
-    )
+    if sym_type in (SymmetryType.Vertical, SymmetryType.Quad):
+        lines.append((rect.midtop, rect.midbottom))
+
+    if sym_type in (SymmetryType.Horizontal, SymmetryType.Quad):
+        lines.append((rect.midleft, rect.midright))
+
+    if sym_type == SymmetryType.Diagonal:
+        side = min(rect.w, rect.h)
+        lines.append((rect.topleft, (rect.x + side, rect.y + side)))
+
+    if sym_type == SymmetryType.Rotational:
+        pg.draw.circle(surface, BLACK, rect.center, line_width * 2)
+
+    for start, end in lines:
+        pg.draw.line(surface, BLACK, start, end, width=line_width)
 
 
 def draw_grid(where: pg.Rect, size: Tuple[int, int], line_width: int):
@@ -245,7 +286,7 @@ def draw_keybindings(keybindings: Iterable[KeyBinding], line_width: int) -> None
 
     binding_text_position = pg.Rect((line_width + 10, 0), (0, 0))
     for group, bindings in grouped_bindings:
-        text = f"{group}: {', '.join([pg.key.name(binding.keycode) for binding in bindings])}"
+        text = f"{group}: {', '.join([binding.name for binding in bindings])}"
         text_surface = new_text_surface(text, color=WHITE)
         binding_text_position.move_ip(0, text_surface.get_height() + 10)
         keybindings_surface.blit(text_surface, binding_text_position)
@@ -266,24 +307,73 @@ def draw_help_keybind(help_binding: KeyBinding, rectangle_rect: pg.Rect) -> None
     all the other available keybindings
     """
     binding_text_position = rectangle_rect.move(0, (rectangle_rect.h + 20))
-    text = f"{help_binding.group}: {pg.key.name(help_binding.keycode)}"
+    text = f"{help_binding.group}: {help_binding.name}"
     text_surface = new_text_surface(text, color=WHITE)
     text_rect = rect_screen_center(binding_text_position, center_x=True)
     binding_text_position.move_ip(0, text_surface.get_height() + 10)
     blit_text_to_screen(text_surface, text_rect)
 
 
+def draw_recording_indicator(rectangle_rect: pg.Rect) -> None:
+    """
+    Draw in pygame's display surface a notice that a macro is being recorded,
+    below the rectangle around the image
+    """
+    text_surface = new_text_surface("Recording macro", color=RED)
+    blit_text_to_screen(text_surface, rectangle_rect.bottomleft)
+
+
+def draw_statistics(lines: Tuple[str, ...], line_width: int) -> None:
+    """
+    Draw in pygame's display surface the lines of image statistics at the top left corner
+    """
+    pg.display.get_surface().blit(statistics_surface(lines, line_width), (0, 0))
+
+
+@functools.lru_cache(maxsize=1)
+def statistics_surface(lines: Tuple[str, ...], line_width: int) -> pg.Surface:
+    """
+    Return a surface with the lines of image statistics, which is only rendered again
+    when they change
+    """
+    text_surfaces = [new_text_surface(line, color=WHITE) for line in lines]
+    margin = line_width + 5
+    surface = pg.Surface(
+        (
+            max(text.get_width() for text in text_surfaces) + 2 * margin,
+            sum(text.get_height() for text in text_surfaces) + 2 * margin,
+        ),
+        pg.SRCALPHA,
+    )
+    pg.draw.rect(
+        surface, BLACK, surface.get_rect(), border_radius=DEFAULT_BORDER_RADIUS
+    )
+
+    y = margin
+    for text in text_surfaces:
+        surface.blit(text, (margin, y))
+        y += text.get_height()
+    return surface
+
+
 def new_text_surface(
     text: str, size: int = 12, color: pg.color.Color = BLACK
 ) -> pg.Surface:
     """
     Return a pygame Surface with the rendering of the text using the specified size and the default font.
     """
+    return load_font(size).render(text, False, color, None)
+
+
+@functools.lru_cache(maxsize=8)
+def load_font(size: int) -> pg.font.Font:
+    """
+    Return the default font in the specified size, loading the font file only the first time
+    """
     default_font = (
         Path(__file__).parent / "assets" / "fonts" / "PressStart2P-Regular.ttf"
     ).resolve()
-    font = pg.font.Font(default_font, size)
-    return font.render(text, False, color, None)
+    return pg.font.Font(default_font, size)
 
 
 def rect_screen_center(
@@ -305,60 +395,95 @@ def rect_screen_center(
     return rect.x, rect.y
 
 
-def scale_surface(surface: pg.Surface, percentage: int) -> pg.Surface:
+def draw_pixels(
+    image: pg.Surface,
+    positions: Iterable[Tuple[int, int]],
+    color: pg.Color,
+    symmetry_type: SymmetryType,
+) -> List[Tuple[Tuple[int, int], pg.Color]]:
     """
-    Scale surface to a specified percentage of it
+    Draw pixels of the selected color at the determined positions of image, taking symmetry type
+    into account to determine whether to and how to mirror the changes done to each position.
+
+    All the symmetric positions of the stroke are computed first from the precomputed SymmetryMap
+    of the image size, and then written in a single pass with the surface locked once.
+
+    Return a list with the position and previous color of every pixel that was drawn.
     """
-    new_image_resolution = [
-        xy * percentage // 100 for xy in (surface.get_width(), surface.get_height())
-    ]
-    return pg.transform.scale(surface, new_image_resolution)
+    stroke = get_symmetry_map(image.get_size()).stroke_positions(
+        positions, symmetry_type
+    )
 
+    image.lock()
+    try:
+        previous_pos_and_colors = [
+            (position, image.get_at(position)) for position in stroke
+        ]
+        for position in stroke:
+            image.set_at(position, color)
+    finally:
+        image.unlock()
 
-def draw_pixel(
-    image: pg.Surface,
-    position: Tuple[int, int],
-    color: pg.Color,
-    symmetry_type: SymmetryType,
-) -> Union[None, Tuple[Tuple[int, int], pg.Color]]:
+    return previous_pos_and_colors
+
+
+def copy_region(image: pg.Surface, rect: pg.Rect) -> pg.Surface:
     """
-    Draw a pixel of the selected color at the determined position of image, taking symmetry type
-    into account to determine whether to and how to mirror the change done in position to its
-    symmetric pixel, horizontally or vertically.
+    Return a copy of the pixels of image inside rect
+    """
+    return image.subsurface(rect).copy()
+
 
-    For a coordinate (x, y) and an image of width and height (w, h) and considering
-    d is the difference between the middle width w / 2 and x, the coordinate for the
-    vertically symmetric pixel of (x, y) is (w / 2 + d, y), mirroring the pixel.
+def restore_region(image: pg.Surface, region: pg.Surface, position: Tuple[int, int]):
+    """
+    Write the pixels of region into image at position, replacing them instead of blending.
+    Images with per-pixel alpha are cleared first, since blitting onto transparent pixels
+    copies the source pixels as they are. The colorkey and surface alpha of region are
+    turned off during the blit, so paletted and colorkeyed images are copied exactly too.
+    """
+    rect = region.get_rect(topleft=position)
+    if image.get_flags() & pg.SRCALPHA:
+        image.fill(ALPHA, rect)
 
-    For a coordinate (x, y) and an image of width and height (w, h) and considering
-    d is the difference between middle height h / 2 and y, the coordinate for the
-    horizontally symmetric pixel of (x, y) is (x, h / 2 + d), mirroring the pixel.
+    colorkey, alpha = region.get_colorkey(), region.get_alpha()
+    region.set_colorkey(None)
+    region.set_alpha(None)
+    try:
+        image.blit(region, rect)
+    finally:
+        region.set_colorkey(colorkey)
+        region.set_alpha(alpha)
 
-    In addition, integer division is used in the code to divide the height and width
-    to avoid getting float values when dividing odd values, and 1 has to be subtracted
-    to account for 0-indexing.
 
-    Return None if no symmetry is set.
-    Return position and color of symmetric pixel if SymmetryType is not NoSymmetry.
+def draw_spans(
+    image: pg.Surface,
+    spans: Iterable[Span],
+    color: pg.Color,
+    symmetry_type: SymmetryType,
+) -> Union[None, Tuple[pg.Rect, pg.Surface]]:
     """
-    pixel_x, pixel_y = position
+    Draw spans of the selected color in image, taking symmetry type into account to mirror them.
+    Each span, and each of its symmetric spans, is drawn with a single fill.
 
-    if symmetry_type is SymmetryType.NoSymmetry:
-        image.set_at(position, color)
+    Return None if no pixel of the image was covered.
+    Return the bounding box of the covered pixels and a copy of what it contained before drawing.
+    """
+    symmetry_map = get_symmetry_map(image.get_size())
+    image_rect = image.get_rect()
+    rects = [
+        symmetric_rect.clip(image_rect)
+        for x_start, x_end, y in spans
+        for symmetric_rect in symmetry_map.rects(
+            pg.Rect(x_start, y, x_end - x_start + 1, 1), symmetry_type
+        )
+    ]
+    rects = [rect for rect in rects if rect.w and rect.h]
+    if not rects:
         return None
 
-    elif symmetry_type is SymmetryType.Vertical:
-        image.set_at(position, color)
-        middle_w = image.get_width() // 2
-        symmetric_draw_pos = (middle_w + (middle_w - pixel_x) - 1, pixel_y)
-        symmetric_pos_color = image.get_at(symmetric_draw_pos)
-        image.set_at(symmetric_draw_pos, color)
-        return symmetric_draw_pos, symmetric_pos_color
-
-    elif symmetry_type is SymmetryType.Horizontal:
-        image.set_at(position, color)
-        middle_h = image.get_height() // 2
-        symmetric_draw_pos = (pixel_x, middle_h + (middle_h - pixel_y) - 1)
-        symmetric_pos_color = image.get_at(symmetric_draw_pos)
-        image.set_at(symmetric_draw_pos, color)
-        return symmetric_draw_pos, symmetric_pos_color
+    bounding_box = rects[0].unionall(rects[1:])
+    previous_region = copy_region(image, bounding_box)
+    for rect in rects:
+        image.fill(color, rect)
+
+    return bounding_box, previous_region
@@ -0,0 +1,205 @@
+import collections
+import logging
+from fractions import Fraction
+from typing import Tuple
+
+import pygame as pg
+
+from pypixelart.utils import restore_region
+
+CacheInfo = collections.namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+
+class ZoomEngine:
+    """
+    Keeps the zoom at levels where every pixel of the image is the same size on the screen:
+    integer scales when zoomed in, and halvings built with smoothscale when zoomed out.
+
+    The image scaled to each level is kept in a small LRU cache, so frames only scale the
+    image again after it changes. Changing level animates the scale over a few frames,
+    scaling the cached target level instead of the image. Edits only scale the region
+    they changed again, so the cached levels don't have to be rebuilt after every pixel.
+    """
+
+    def __init__(
+        self,
+        image_size: Tuple[int, int],
+        view_size: Tuple[int, int],
+        cache_size: int = 4,
+        animation_frames: int = 6,
+        max_scaled_size: int = 4096,
+    ):
+        width, height = image_size
+        biggest_dimension = max(width, height)
+
+        reduced_levels = []
+        reduction = Fraction(1, 2)
+        while biggest_dimension * reduction >= 1 and reduction >= Fraction(1, 32):
+            reduced_levels.insert(0, reduction)
+            reduction /= 2
+
+        integer_levels = [Fraction(1)]
+        while (
+            biggest_dimension * (integer_levels[-1] + 1) <= max_scaled_size
+            and integer_levels[-1] < 64
+        ):
+            integer_levels.append(integer_levels[-1] + 1)
+
+        self.levels: Tuple[Fraction, ...] = tuple(reduced_levels + integer_levels)
+
+        # Start at the biggest level that fits in the view, or the smallest one if none do
+        view_width, view_height = view_size
+        self.level_index: int = 0
+        for i, level in enumerate(self.levels):
+            if width * level <= view_width and height * level <= view_height:
+                self.level_index = i
+        logging.debug("Zoom initialized to %s", self.scale)
+
+        self.cache_size = cache_size
+        self.animation_frames = animation_frames
+        self.animation_frame: int = animation_frames
+        self.animation_start_scale: float = float(self.scale)
+        self.display_scale: float = float(self.scale)
+
+        self._cache: "collections.OrderedDict[Fraction, pg.Surface]" = (
+            collections.OrderedDict()
+        )
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def scale(self) -> Fraction:
+        """
+        Scale of the level the zoom is at or animating to
+        """
+        return self.levels[self.level_index]
+
+    @property
+    def percent(self) -> int:
+        return round(self.display_scale * 100)
+
+    @property
+    def is_animating(self) -> bool:
+        return self.animation_frame < self.animation_frames
+
+    def set_scale(self, scale: Fraction) -> None:
+        """
+        Jump to the level with scale, without animating. Does nothing if there's no such level.
+        """
+        if scale in self.levels:
+            self.level_index = self.levels.index(scale)
+            self.animation_frame = self.animation_frames
+            self.display_scale = float(scale)
+
+    def step(self, direction: int) -> None:
+        """
+        Zoom in one level if direction is positive or out if it's negative. Steps taken
+        while the previous one is still animating are ignored, so holding the key moves
+        through the levels at the speed of the animation.
+        """
+        if self.is_animating:
+            return
+
+        new_index = min(max(self.level_index + direction, 0), len(self.levels) - 1)
+        if new_index == self.level_index:
+            return
+
+        self.level_index = new_index
+        self.animation_start_scale = self.display_scale
+        self.animation_frame = 0
+        logging.debug("Zoom level set to %s", self.scale)
+
+    def update(self) -> None:
+        """
+        Advance the animation by one frame. The scale is interpolated geometrically,
+        so zooming in and out look equally fast.
+        """
+        if not self.is_animating:
+            return
+
+        self.animation_frame += 1
+        progress = self.animation_frame / self.animation_frames
+        target = float(self.scale)
+        self.display_scale = (
+            self.animation_start_scale
+            * (target / self.animation_start_scale) ** progress
+        )
+        if not self.is_animating:
+            self.display_scale = target
+
+    def invalidate(self) -> None:
+        """
+        Forget the scaled levels, because the image changed
+        """
+        self._cache.clear()
+
+    def update_region(self, image: pg.Surface, rect: pg.Rect) -> None:
+        """
+        Bring the cached levels up to date after the pixels of image inside rect changed.
+        Integer levels only scale that region again, while reduced levels are forgotten,
+        since each of their pixels is an average of pixels that may lie outside of rect.
+        """
+        rect = rect.clip(image.get_rect())
+        if not rect.w or not rect.h:
+            return
+
+        for level in list(self._cache):
+            if level.denominator != 1:
+                del self._cache[level]
+                continue
+
+            factor = int(level)
+            scaled_rect = pg.Rect(
+                rect.x * factor, rect.y * factor, rect.w * factor, rect.h * factor
+            )
+            if rect.w == rect.h == 1:
+                # A single pixel, like the ones drawn by cursors, scales to a square
+                self._cache[level].fill(image.get_at(rect.topleft), scaled_rect)
+                continue
+            scaled_region = pg.transform.scale(image.subsurface(rect), scaled_rect.size)
+            # Replace the pixels instead of blending, so transparent ones stay transparent
+            restore_region(self._cache[level], scaled_region, scaled_rect.topleft)
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Hits and misses of the scaled level cache, in the format of functools.lru_cache
+        """
+        return CacheInfo(self.hits, self.misses, self.cache_size, len(self._cache))
+
+    def surface(self, image: pg.Surface) -> pg.Surface:
+        """
+        Return the image scaled to the current zoom
+        """
+        scaled = self.level_surface(image, self.scale)
+        if not self.is_animating:
+            return scaled
+
+        size = [max(1, round(xy * self.display_scale)) for xy in image.get_size()]
+        return pg.transform.scale(scaled, size)
+
+    def level_surface(self, image: pg.Surface, level: Fraction) -> pg.Surface:
+        """
+        Return the image scaled to level, from the cache if it's there
+        """
+        if level in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(level)
+            return self._cache[level]
+
+        self.misses += 1
+        if level >= 1:
+            size = [int(xy * level) for xy in image.get_size()]
+            scaled = pg.transform.scale(image, size)
+        else:
+            # Every reduced level is built from the one twice its size
+            larger = image if level * 2 == 1 else self.level_surface(image, level * 2)
+            size = [max(1, int(xy * level)) for xy in image.get_size()]
+            if larger.get_bitsize() in (24, 32):
+                scaled = pg.transform.smoothscale(larger, size)
+            else:
+                scaled = pg.transform.scale(larger, size)
+
+        self._cache[level] = scaled
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return scaled
@@ -0,0 +1,40 @@
+import os
+
+# Draw into memory instead of opening a window, so the tests run without a display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame as pg
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-golden",
+        action="store_true",
+        default=False,
+        help="Record the frames drawn as the new golden images instead of comparing them",
+    )
+    parser.addoption(
+        "--check-timing",
+        action="store_true",
+        default=False,
+        help="Fail rendering scenarios whose slowest frame takes longer than their limit",
+    )
+
+
+@pytest.fixture
+def update_golden(request) -> bool:
+    return request.config.getoption("--update-golden")
+
+
+@pytest.fixture
+def check_timing(request) -> bool:
+    return request.config.getoption("--check-timing")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def display():
+    pg.display.init()
+    pg.font.init()
+    yield
+    pg.quit()
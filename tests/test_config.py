@@ -0,0 +1,158 @@
+import json
+import os
+
+import pygame as pg
+import pytest
+
+from pypixelart.config import (
+    Config,
+    ConfigError,
+    apply_bindings,
+    compile_config,
+    load_config,
+    tomllib,
+)
+from pypixelart.keybinding import KeyBinding
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data))
+    return path
+
+
+def test_compile_json_config(tmp_path):
+    (tmp_path / "colors.hex").write_text("ff0000\n00ff0080\n")
+    path = write_json(
+        tmp_path / "config.json",
+        {
+            "bindings": {"Draw": "shift+d"},
+            "palette": {"file": "colors.hex", "colors": {"skin": "#f5c6a5"}},
+            "performance": {"fps": 30, "history_limit": 100},
+        },
+    )
+
+    config, sources = compile_config(path)
+
+    assert config.bindings == {"Draw": (pg.K_d, True)}
+    assert config.palette == [
+        ("#ff0000", (255, 0, 0, 255)),
+        ("#00ff0080", (0, 255, 0, 128)),
+        ("skin", (245, 198, 165, 255)),
+    ]
+    assert (config.fps, config.zoom_cache_size, config.history_limit) == (30, 4, 100)
+    assert sources == [path, tmp_path / "colors.hex"]
+
+
+@pytest.mark.skipif(tomllib is None, reason="TOML configs need Python 3.11 or tomli")
+def test_compile_toml_config(tmp_path):
+    path = tmp_path / "config.toml"
+    path.write_text('[bindings]\nDraw = "shift+d"\n[performance]\nfps = 30\n')
+
+    config, _ = compile_config(path)
+
+    assert config.bindings == {"Draw": (pg.K_d, True)}
+    assert config.fps == 30
+
+
+def test_gimp_palette(tmp_path):
+    (tmp_path / "palette.gpl").write_text(
+        "GIMP Palette\nName: test\n# comment\n255 0 0 Red\n0 0 255\n255 0 0 Red\n"
+    )
+    path = write_json(tmp_path / "config.json", {"palette": {"file": "palette.gpl"}})
+
+    config, _ = compile_config(path)
+
+    assert config.palette == [
+        ("Red", (255, 0, 0, 255)),
+        ("color 2", (0, 0, 255, 255)),
+        ("Red 2", (255, 0, 0, 255)),
+    ]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        [],
+        {"colours": {}},
+        {"bindings": {"Draw": "ctrl+d"}},
+        {"bindings": {"Draw": "not a key"}},
+        {"bindings": {"Draw": 4}},
+        {"palette": {"colors": {"bad": "#12345"}}},
+        {"palette": {"colors": {"bad": [1, 2, 300]}}},
+        {"palette": {"file": "missing.gpl"}},
+        {"palette": {"colors": {}}},
+        {"performance": {"fps": 0}},
+        {"performance": {"history_limit": True}},
+        {"performance": {"speed": 1}},
+    ],
+)
+def test_invalid_configs(tmp_path, data):
+    path = write_json(tmp_path / "config.json", data)
+
+    with pytest.raises(ConfigError):
+        compile_config(path)
+
+
+def test_invalid_json(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text("{")
+
+    with pytest.raises(ConfigError):
+        compile_config(path)
+
+
+def test_compiled_config_is_cached_until_a_source_changes(tmp_path, monkeypatch):
+    path = write_json(tmp_path / "config.json", {"performance": {"fps": 30}})
+    cache_dir = tmp_path / "cache"
+    assert load_config(path, cache_dir).fps == 30
+
+    compiled = []
+    monkeypatch.setattr(
+        "pypixelart.config.compile_config",
+        lambda path: compiled.append(path) or compile_config(path),
+    )
+    assert load_config(path, cache_dir).fps == 30
+    assert compiled == []
+
+    write_json(path, {"performance": {"fps": 20}})
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert load_config(path, cache_dir).fps == 20
+    assert compiled == [path]
+
+
+def bindings():
+    return [
+        KeyBinding(pg.K_i, "Draw", lambda: None),
+        KeyBinding(pg.K_d, "Cut", lambda: None),
+        KeyBinding(pg.K_f, "Flip", lambda: None),
+        KeyBinding(pg.K_f, "Flip", lambda: None, shift=True),
+    ]
+
+
+def test_apply_bindings_by_group_and_key_name():
+    keybindings = bindings()
+
+    apply_bindings(keybindings, {"Draw": (pg.K_p, False), "shift+f": (pg.K_v, True)})
+
+    assert [b.name for b in keybindings] == ["p", "d", "f", "shift+v"]
+
+
+@pytest.mark.parametrize(
+    "new_bindings",
+    [
+        {"Draw": (pg.K_d, False)},
+        {"Flip": (pg.K_g, False)},
+        {"Paste": (pg.K_g, False)},
+    ],
+    ids=["conflict", "ambiguous group", "unknown binding"],
+)
+def test_invalid_bindings(new_bindings):
+    with pytest.raises(ConfigError):
+        apply_bindings(bindings(), new_bindings)
+
+
+def test_default_palette_is_kept_without_palette():
+    default = {"black": pg.Color(0, 0, 0)}
+
+    assert Config().palette_colors(default) == default
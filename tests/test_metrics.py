@@ -0,0 +1,33 @@
+from pypixelart.metrics import Metrics
+
+
+def test_prometheus_families_are_typed_once_before_their_samples():
+    metrics = Metrics()
+    metrics.enabled = True
+    metrics.increment("commands_executed", type="DrawSpans")
+    metrics.increment("commands_executed", type="DrawPixels")
+    metrics.set_gauge("undo_bytes", 12)
+    metrics.observe("frame_seconds", 0.02)
+
+    lines = metrics.to_prometheus().splitlines()
+
+    type_lines = [line for line in lines if line.startswith("# TYPE")]
+    assert type_lines == [
+        "# TYPE pypixelart_commands_executed_total counter",
+        "# TYPE pypixelart_undo_bytes gauge",
+        "# TYPE pypixelart_frame_seconds histogram",
+    ]
+    for type_line in type_lines:
+        name = type_line.split()[2]
+        first_sample = next(i for i, line in enumerate(lines) if line.startswith(name))
+        assert lines.index(type_line) == first_sample - 1
+    assert 'pypixelart_frame_seconds_bucket{le="0.025"} 1' in lines
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics()
+    metrics.increment("commands_executed")
+    with metrics.timer("frame_seconds"):
+        pass
+
+    assert metrics.to_prometheus() == "\n"
@@ -0,0 +1,185 @@
+import io
+import random
+import struct
+import zlib
+
+import pygame as pg
+import pytest
+
+from pypixelart import png_stream
+from pypixelart.png_stream import NotStreamable, load_image, read_png, write_png
+
+
+def random_image(size, seed=0) -> pg.Surface:
+    rng = random.Random(seed)
+    image = pg.Surface(size, pg.SRCALPHA)
+    for _ in range(200):
+        color = [rng.randrange(256) for _ in range(4)]
+        rect = (rng.randrange(size[0]), rng.randrange(size[1]), 5, 3)
+        image.fill(color, rect)
+    return image
+
+
+def rgba(image: pg.Surface) -> bytes:
+    return pg.image.tostring(image, "RGBA")
+
+
+def paeth(left, up, up_left):
+    estimate = left + up - up_left
+    distances = abs(estimate - left), abs(estimate - up), abs(estimate - up_left)
+    if distances[0] <= distances[1] and distances[0] <= distances[2]:
+        return left
+    return up if distances[1] <= distances[2] else up_left
+
+
+def encode_png(rows, width, color_type, pixel_bytes, filters) -> bytes:
+    """
+    Return a PNG of rows, filtering each one with the next filter type of filters
+    """
+    filtered = bytearray()
+    prior = bytes(len(rows[0]))
+    for y, row in enumerate(rows):
+        filter_type = filters[y % len(filters)]
+        filtered.append(filter_type)
+        for i, value in enumerate(row):
+            left = row[i - pixel_bytes] if i >= pixel_bytes else 0
+            up_left = prior[i - pixel_bytes] if i >= pixel_bytes else 0
+            predictor = [
+                0,
+                left,
+                prior[i],
+                (left + prior[i]) // 2,
+                paeth(left, prior[i], up_left),
+            ][filter_type]
+            filtered.append((value - predictor) & 0xFF)
+        prior = row
+
+    file = io.BytesIO()
+    file.write(png_stream.PNG_SIGNATURE)
+    header = struct.pack(">IIBBBBB", width, len(rows), 8, color_type, 0, 0, 0)
+    png_stream.write_chunk(file, b"IHDR", header)
+    compressed = zlib.compress(bytes(filtered))
+    # Several IDAT chunks, to decode rows split between chunks
+    for i in range(0, len(compressed), 500):
+        png_stream.write_chunk(file, b"IDAT", compressed[i : i + 500])
+    png_stream.write_chunk(file, b"IEND", b"")
+    return file.getvalue()
+
+
+def test_write_and_read_round_trip(tmp_path, monkeypatch):
+    # Small strips, so the image is written and read in several of them
+    monkeypatch.setattr(png_stream, "STRIP_BYTES", 1000)
+    image = random_image((61, 47))
+    path = tmp_path / "image.png"
+
+    write_png(image, path)
+
+    assert rgba(read_png(path)) == rgba(image)
+    assert rgba(pg.image.load(path)) == rgba(image)
+
+
+@pytest.mark.parametrize("color_type, pixel_bytes", [(0, 1), (2, 3), (6, 4)])
+@pytest.mark.parametrize("filters", [[0], [1], [2], [3], [4], [0, 1, 2, 3, 4]])
+def test_read_filtered_rows(tmp_path, monkeypatch, color_type, pixel_bytes, filters):
+    monkeypatch.setattr(png_stream, "STRIP_BYTES", 300)
+    rng = random.Random(color_type)
+    width, height = 37, 23
+    rows = [
+        bytes(
+            rng.choice([rng.randrange(256), 0, 255]) for _ in range(width * pixel_bytes)
+        )
+        for _ in range(height)
+    ]
+    path = tmp_path / "filtered.png"
+    path.write_bytes(encode_png(rows, width, color_type, pixel_bytes, filters))
+
+    assert rgba(read_png(path)) == rgba(pg.image.load(path))
+
+
+def test_read_png_saved_by_pygame(tmp_path):
+    image = random_image((120, 80), seed=1)
+    path = tmp_path / "pygame.png"
+    pg.image.save(image, path)
+
+    assert rgba(read_png(path)) == rgba(image)
+
+
+def test_load_image_streams_big_images(tmp_path, monkeypatch):
+    image = random_image((40, 30))
+    path = tmp_path / "image.png"
+    write_png(image, path)
+    monkeypatch.setattr(png_stream, "STREAMING_THRESHOLD", 0)
+    streamed = []
+    monkeypatch.setattr(
+        png_stream, "read_png", lambda path: streamed.append(path) or read_png(path)
+    )
+
+    assert rgba(load_image(path)) == rgba(image)
+    assert streamed == [path]
+
+
+def test_load_image_falls_back_to_pygame(tmp_path, monkeypatch):
+    # Paletted PNGs can't be streamed
+    image = pg.Surface((20, 10), depth=8)
+    image.set_palette([(i, 255 - i, i // 2) for i in range(256)])
+    image.fill(image.get_palette_at(7), (0, 0, 10, 10))
+    path = tmp_path / "paletted.png"
+    pg.image.save(image, path)
+    monkeypatch.setattr(png_stream, "STREAMING_THRESHOLD", 0)
+
+    with pytest.raises(NotStreamable):
+        read_png(path)
+    assert load_image(path).get_at((0, 0)) == image.get_palette_at(7)
+
+
+@pytest.fixture
+def png_bytes(tmp_path) -> bytes:
+    path = tmp_path / "image.png"
+    write_png(random_image((30, 20)), path)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize("length", [0, 8, 20, 40, -20, -5])
+def test_truncated_file(tmp_path, png_bytes, length):
+    path = tmp_path / "truncated.png"
+    path.write_bytes(png_bytes[:length])
+
+    with pytest.raises(NotStreamable):
+        read_png(path)
+
+
+def test_bad_crc(tmp_path, png_bytes):
+    corrupt = bytearray(png_bytes)
+    corrupt[len(corrupt) // 2] ^= 0xFF
+    path = tmp_path / "corrupt.png"
+    path.write_bytes(corrupt)
+
+    with pytest.raises(NotStreamable, match="CRC"):
+        read_png(path)
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        [(b"IHDR", b"short")],
+        [
+            (b"IHDR", struct.pack(">IIBBBBB", 10, 10, 8, 6, 0, 0, 0)),
+            (b"IDAT", b"not zlib data"),
+        ],
+        [
+            (b"IHDR", struct.pack(">IIBBBBB", 10, 10, 8, 6, 0, 0, 0)),
+            (b"IDAT", zlib.compress(b"\x00" * 41)),
+        ],
+    ],
+    ids=["short IHDR", "corrupt zlib", "missing rows"],
+)
+def test_corrupt_chunks(tmp_path, chunks):
+    file = io.BytesIO()
+    file.write(png_stream.PNG_SIGNATURE)
+    for chunk_type, data in chunks + [(b"IEND", b"")]:
+        png_stream.write_chunk(file, chunk_type, data)
+    path = tmp_path / "corrupt.png"
+    path.write_bytes(file.getvalue())
+
+    with pytest.raises(NotStreamable):
+        read_png(path)
@@ -0,0 +1,131 @@
+from fractions import Fraction
+
+import pygame as pg
+import pytest
+
+from pypixelart.project_file import (
+    PALETTE_NAME_SIZE,
+    ProjectFile,
+    ProjectFileError,
+    encode_palette_names,
+)
+
+
+def rgba(image: pg.Surface) -> bytes:
+    return pg.image.tostring(image, "RGBA")
+
+
+@pytest.fixture
+def image() -> pg.Surface:
+    image = pg.Surface((70, 45), pg.SRCALPHA)
+    image.fill((10, 20, 30, 255), (0, 0, 40, 20))
+    image.fill((200, 100, 50, 128), (35, 15, 30, 25))
+    return image
+
+
+@pytest.fixture
+def saved_project(tmp_path, image) -> ProjectFile:
+    project = ProjectFile(tmp_path / "image.ppa", image, tile_size=16)
+    project.cursor = (40, 30)
+    project.zoom_scale = Fraction(1, 2)
+    project.palette = {"red": pg.Color(255, 0, 0), "clear": pg.Color(0, 0, 0, 0)}
+    project.save()
+    return project
+
+
+def test_round_trip(saved_project, image):
+    project = ProjectFile.open(saved_project.path)
+    project.load_all()
+
+    assert rgba(project.image) == rgba(image)
+    assert project.cursor == (40, 30)
+    assert project.zoom_scale == Fraction(1, 2)
+    assert project.palette == saved_project.palette
+
+
+def test_transparent_tiles_are_not_stored(saved_project):
+    project = ProjectFile.open(saved_project.path)
+
+    transparent = [
+        tile for tile, (_, length, _) in enumerate(project.tile_index) if not length
+    ]
+    assert transparent
+    assert set(project.pending_tiles).isdisjoint(transparent)
+
+
+def test_tiles_are_decoded_closest_to_the_cursor_first(saved_project):
+    project = ProjectFile.open(saved_project.path)
+
+    first_rect = project.load_tiles(budget_seconds=0)[0]
+    assert first_rect.collidepoint(project.cursor)
+    assert project.is_loading
+
+
+def test_saving_again_only_rewrites_changed_tiles(saved_project):
+    saved_project.image.fill((1, 2, 3, 255), (50, 40, 3, 3))
+    saved_project.mark_dirty(pg.Rect(50, 40, 3, 3))
+    assert saved_project.dirty_tiles == {
+        saved_project.tiles_in(pg.Rect(50, 40, 1, 1))[0]
+    }
+    saved_project.save()
+
+    project = ProjectFile.open(saved_project.path)
+    project.load_all()
+    assert rgba(project.image) == rgba(saved_project.image)
+
+
+def test_long_palette_names_stay_unique(tmp_path, image):
+    long_name = "a very long name for a color in the palette"
+    project = ProjectFile(tmp_path / "image.ppa", image, tile_size=16)
+    project.palette = {
+        long_name + " 1": pg.Color(1, 1, 1),
+        long_name + " 2": pg.Color(2, 2, 2),
+        "é" * 20: pg.Color(3, 3, 3),
+    }
+    project.save()
+
+    palette = ProjectFile.open(project.path).palette
+    assert list(palette.values()) == list(project.palette.values())
+    assert all(len(name.encode()) <= PALETTE_NAME_SIZE for name in palette)
+    assert "é" * (PALETTE_NAME_SIZE // 2) in palette
+
+
+def test_encode_palette_names_keeps_names_that_fit():
+    assert encode_palette_names(["red", "green"]) == [b"red", b"green"]
+
+
+@pytest.mark.parametrize(
+    "contents",
+    [b"", b"PPAPROJ", b"NOTAPROJ" + bytes(100)],
+    ids=["empty", "truncated header", "bad magic"],
+)
+def test_invalid_files(tmp_path, contents):
+    path = tmp_path / "invalid.ppa"
+    path.write_bytes(contents)
+
+    with pytest.raises(ProjectFileError):
+        ProjectFile.open(path)
+
+
+def test_truncated_tiles(saved_project):
+    data = saved_project.path.read_bytes()
+    saved_project.path.write_bytes(data[: len(data) // 2])
+
+    with pytest.raises(ProjectFileError):
+        ProjectFile.open(saved_project.path)
+
+
+def test_corrupt_tile_is_left_transparent(saved_project, image):
+    project = ProjectFile.open(saved_project.path)
+    offset, _, _ = project.tile_index[0]
+    project.load_all()
+    data = bytearray(saved_project.path.read_bytes())
+    data[offset + 4] ^= 0xFF
+    saved_project.path.write_bytes(data)
+
+    project = ProjectFile.open(saved_project.path)
+    project.load_all()
+
+    assert project.corrupt_tiles == {0}
+    assert project.image.get_at((0, 0)) == (0, 0, 0, 0)
+    assert project.image.get_at((20, 0)) == image.get_at((20, 0))
@@ -0,0 +1,166 @@
+import base64
+import json
+import socket
+import threading
+
+import pygame as pg
+import pytest
+
+from pypixelart import PyPixelArt
+from pypixelart.remote import RemoteServer, apply_batch
+
+RED = (255, 0, 0, 255)
+
+
+@pytest.fixture
+def app(tmp_path) -> PyPixelArt:
+    image = pg.Surface((8, 8), pg.SRCALPHA)
+    return PyPixelArt(image, tmp_path / "image.png")
+
+
+def test_set_pixels(app):
+    apply_batch(
+        app, [{"op": "set_pixels", "color": list(RED), "positions": [[1, 2], [3, 4]]}]
+    )
+
+    assert app.image.get_at((1, 2)) == RED
+    assert app.image.get_at((3, 4)) == RED
+    assert app.image.get_at((2, 3)) == (0, 0, 0, 0)
+
+
+def test_fill_rect_is_clipped_to_the_image(app):
+    apply_batch(app, [{"op": "fill_rect", "color": list(RED), "rect": [6, 6, 5, 5]}])
+
+    assert app.image.get_at((7, 7)) == RED
+    assert app.image.get_at((5, 5)) == (0, 0, 0, 0)
+
+
+def test_blit(app):
+    pixels = bytes([1, 2, 3, 4] * 6)
+    apply_batch(
+        app,
+        [
+            {
+                "op": "blit",
+                "rect": [2, 2, 3, 2],
+                "rgba": base64.b64encode(pixels).decode(),
+            }
+        ],
+    )
+
+    assert app.image.get_at((4, 3)) == (1, 2, 3, 4)
+    assert app.image.get_at((5, 3)) == (0, 0, 0, 0)
+
+
+def test_edits_of_a_batch_are_undone_together(app):
+    apply_batch(
+        app,
+        [
+            {"op": "set_pixels", "color": list(RED), "positions": [[0, 0]]},
+            {"op": "fill_rect", "color": list(RED), "rect": [4, 4, 2, 2]},
+        ],
+    )
+    apply_batch(app, [{"op": "undo"}])
+
+    assert app.image.get_at((0, 0)) == (0, 0, 0, 0)
+    assert app.image.get_at((4, 4)) == (0, 0, 0, 0)
+
+    apply_batch(app, [{"op": "redo"}])
+    assert app.image.get_at((0, 0)) == RED
+    assert app.image.get_at((4, 4)) == RED
+
+
+@pytest.mark.parametrize(
+    "operation, error",
+    [
+        ({"op": "set_pixels", "color": list(RED), "positions": [[8, 0]]}, ValueError),
+        ({"op": "set_pixels", "color": list(RED)}, KeyError),
+        ({"op": "blit", "rect": [0, 0, 2, 2], "rgba": "AAAA"}, ValueError),
+        ({"op": "blit", "rect": [0, 0, 1, 1], "rgba": "not base64!"}, ValueError),
+        ({"op": "blit", "rect": [7, 7, 2, 2], "rgba": ""}, ValueError),
+        ({"op": "rotate"}, ValueError),
+    ],
+    ids=[
+        "outside",
+        "missing key",
+        "short pixels",
+        "bad base64",
+        "blit outside",
+        "unknown op",
+    ],
+)
+def test_invalid_batch_changes_nothing(app, operation, error):
+    before = pg.image.tostring(app.image, "RGBA")
+
+    with pytest.raises(error):
+        apply_batch(
+            app,
+            [
+                {"op": "set_pixels", "color": list(RED), "positions": [[0, 0]]},
+                operation,
+            ],
+        )
+
+    assert pg.image.tostring(app.image, "RGBA") == before
+    assert not app.command_controller.undo_stack
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = RemoteServer(str(tmp_path / "remote.sock"))
+    server.start()
+    yield server
+    server.close()
+
+
+def send(server, app, messages):
+    """
+    Send messages from a client thread while the main loop processes them,
+    and return the replies
+    """
+    replies = []
+
+    def client():
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.connect(server.address)
+            with sock.makefile("rwb") as file:
+                for message in messages:
+                    file.write(message + b"\n")
+                    file.flush()
+                    replies.append(json.loads(file.readline()))
+
+    thread = threading.Thread(target=client, daemon=True)
+    thread.start()
+    while thread.is_alive():
+        server.process(app)
+        thread.join(0.01)
+    return replies
+
+
+def test_server_replies_to_every_message(server, app):
+    replies = send(
+        server,
+        app,
+        [
+            json.dumps(
+                {"op": "set_pixels", "color": list(RED), "positions": [[1, 1]]}
+            ).encode(),
+            b"{not json",
+            b"[1, 2]",
+            json.dumps([{"op": "undo"}, {"op": "rotate"}]).encode(),
+        ],
+    )
+
+    assert replies[0] == {"ok": True}
+    assert "invalid JSON" in replies[1]["error"]
+    assert replies[2] == {"error": "operations must be JSON objects"}
+    assert "rotate" in replies[3]["error"]
+    assert app.image.get_at((1, 1)) == RED
+
+
+def test_failed_save_is_an_error_reply(server, app, tmp_path):
+    app.path = tmp_path / "missing" / "image.png"
+
+    replies = send(server, app, [json.dumps({"op": "save"}).encode()])
+
+    assert replies[0]["error"].startswith("couldn't save")
@@ -0,0 +1,209 @@
+"""
+Rendering tests: play scripted key presses into PyPixelArt with SDL's dummy video driver,
+and compare every frame drawn with the golden images in tests/golden.
+
+Record the golden images again with ``python -m pytest tests --update-golden`` only after
+checking that a change to what's drawn is intended, and look at the filmstrips before
+committing them. They're recorded with the pygame of tests/requirements.txt, since
+scaling and text can change between pygame versions.
+
+How long the slowest frame of each scenario took is recorded as the
+slowest_frame_ms property of the test, and it's only checked against the limit of
+the scenario with --check-timing, since shared machines like CI runners vary a lot.
+"""
+
+import pathlib
+from dataclasses import dataclass
+from typing import List, Set, Tuple
+
+import pygame as pg
+import pytest
+
+from pypixelart import PyPixelArt
+
+GOLDEN_DIR = pathlib.Path(__file__).parent / "golden"
+
+# How much each channel of a pixel may differ from the golden image
+TOLERANCE = 0
+
+
+@dataclass
+class Scenario:
+    """
+    Keys pressed on a new image, one entry per frame. Keys are named like the help menu
+    shows them, e.g. "i", "shift+w" or "space", and an empty string draws a frame without
+    pressing anything. Held keys, like the ones for zooming, are held for that frame.
+    """
+
+    name: str
+    keys: List[str]
+    size: Tuple[int, int] = (16, 16)
+    # With --check-timing, the slowest frame may take at most this long, the first
+    # one excluded since it also scales the image for the first time
+    max_frame_seconds: float = 0.05
+
+
+SCENARIOS = [
+    Scenario("draw_undo", ["", "i", "l", "i", "j", "i", "u", "u", "r"]),
+    Scenario(
+        "shapes",
+        ["", "m", "l", "l", "l", "j", "j", "e", "t", "m", "l", "l", "j", "o", "a"],
+    ),
+    Scenario("grid_symmetry", ["", "g", "s", "i", "l", "j", "i", "s", "s", "i"]),
+    Scenario("zoom", ["", "n", "", "", "", "", "", "", "b", "", "", "", "", "", ""]),
+    Scenario(
+        "selection",
+        ["", "i", "l", "i", "v", "l", "j", "y", "l", "l", "l", "p", "f", "shift+f"],
+    ),
+    Scenario(
+        "overlays",
+        ["", "i", "shift+t", "shift+s", "shift+q", "c", "c", "shift+t", "shift+s"],
+    ),
+    Scenario("large_canvas", ["", "i", "g", "l", "i", "g"], size=(512, 512)),
+    Scenario(
+        "cursor_set",
+        ["", "m", "l", "l", "l", "shift+i", "j", "i", "h", "h", "h", "h", "h", "i"]
+        + ["m", "l", "l", "l", "l", "j", "j", "j", "j", "shift+g", "i", "l", "g"]
+        + ["n", "", "", "", "", "", "", "b", "", "shift+c", "i"],
+    ),
+]
+
+
+class HeldKeys:
+    """
+    Stands in for the sequence returned by pg.key.get_pressed, with only keys held
+    """
+
+    def __init__(self, keycodes: Set[int]):
+        self.keycodes = keycodes
+
+    def __getitem__(self, keycode: int) -> bool:
+        return keycode in self.keycodes
+
+
+def key_event(key: str) -> pg.event.Event:
+    """
+    Return the KEYDOWN event of a key named like in the help menu, e.g. "shift+w"
+    """
+    modifier, _, key_name = key.rpartition("+")
+    mod = pg.KMOD_SHIFT if modifier == "shift" else pg.KMOD_NONE
+    return pg.event.Event(pg.KEYDOWN, key=pg.key.key_code(key_name), mod=mod)
+
+
+def capture_screen() -> pg.Surface:
+    """
+    Return a copy of the display surface without alpha, the way it's saved to PNG
+    """
+    screen = pg.display.get_surface()
+    capture = pg.Surface(screen.get_size())
+    capture.blit(screen, (0, 0))
+    return capture
+
+
+def count_different_pixels(
+    image: pg.Surface, other: pg.Surface, tolerance: int
+) -> Tuple[int, pg.Surface]:
+    """
+    Return how many pixels of image have a channel that differs from other by more than
+    tolerance, and a surface with the absolute difference of every pixel
+    """
+    difference = image.copy()
+    difference.blit(other, (0, 0), special_flags=pg.BLEND_RGB_SUB)
+    reverse_difference = other.copy()
+    reverse_difference.blit(image, (0, 0), special_flags=pg.BLEND_RGB_SUB)
+    difference.blit(reverse_difference, (0, 0), special_flags=pg.BLEND_RGB_ADD)
+
+    threshold = (tolerance + 1,) * 3 + (255,)
+    similar = pg.mask.from_threshold(difference, (0, 0, 0), threshold)
+    return image.get_width() * image.get_height() - similar.count(), difference
+
+
+def filmstrip(frames: List[pg.Surface]) -> pg.Surface:
+    """
+    Return the frames stacked from top to bottom in a single surface
+    """
+    width, height = frames[0].get_size()
+    strip = pg.Surface((width, height * len(frames)))
+    for i, frame in enumerate(frames):
+        strip.blit(frame, (0, i * height))
+    return strip
+
+
+def play(
+    scenario: Scenario, directory: pathlib.Path, monkeypatch
+) -> Tuple[List[pg.Surface], List[float]]:
+    """
+    Play the keys of scenario in a new editor whose image is saved in directory.
+    Return the screen captured after every frame and how long each frame took.
+    """
+    app = PyPixelArt(
+        pg.Surface(scenario.size, pg.SRCALPHA),
+        directory / f"{scenario.name}.png",
+    )
+    held_bindings = {b.keycode: b for b in app.keybindings if b.on_pressed}
+
+    held: Set[int] = set()
+    held_mods = [pg.KMOD_NONE]
+    monkeypatch.setattr(pg.key, "get_pressed", lambda: HeldKeys(held))
+    monkeypatch.setattr(pg.key, "get_mods", lambda: held_mods[0])
+
+    frames, frame_seconds = [], []
+    for key in scenario.keys:
+        pg.event.clear()
+        held.clear()
+        held_mods[0] = pg.KMOD_NONE
+        if key:
+            event = key_event(key)
+            if event.key in held_bindings:
+                held.add(event.key)
+                held_mods[0] = event.mod
+            else:
+                pg.event.post(event)
+
+        frame_seconds.append(app.run_frame())
+        frames.append(capture_screen())
+
+    return frames, frame_seconds
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=lambda s: s.name)
+def test_rendering(
+    scenario, tmp_path, monkeypatch, update_golden, check_timing, record_property
+):
+    frames, frame_seconds = play(scenario, tmp_path, monkeypatch)
+    slowest = max(frame_seconds[1:], default=0)
+    record_property("slowest_frame_ms", round(slowest * 1000, 2))
+    golden_path = GOLDEN_DIR / f"{scenario.name}.png"
+
+    if update_golden:
+        pg.image.save(filmstrip(frames), golden_path)
+        return
+
+    golden = pg.image.load(golden_path)
+    frame_width, frame_height = frames[0].get_size()
+    assert golden.get_size() == (frame_width, frame_height * len(frames))
+
+    mismatched_frames, differences = [], []
+    for i, frame in enumerate(frames):
+        golden_frame = pg.Surface(frame.get_size())
+        golden_frame.blit(golden, (0, -i * frame_height))
+        different_pixels, difference = count_different_pixels(
+            frame, golden_frame, TOLERANCE
+        )
+        differences.append(difference)
+        if different_pixels:
+            mismatched_frames.append((i, different_pixels))
+
+    if mismatched_frames:
+        # Keep what was drawn and where it differs, to look at what changed
+        pg.image.save(filmstrip(frames), tmp_path / f"{scenario.name}.actual.png")
+        pg.image.save(filmstrip(differences), tmp_path / f"{scenario.name}.diff.png")
+    assert not mismatched_frames, (
+        f"(frame, different pixels) {mismatched_frames}, "
+        f"actual and diff filmstrips in {tmp_path}"
+    )
+
+    assert not check_timing or slowest <= scenario.max_frame_seconds, (
+        f"slowest frame took {slowest * 1000:.1f} ms, "
+        f"more than {scenario.max_frame_seconds * 1000:.1f} ms"
+    )
@@ -0,0 +1,71 @@
+import os
+
+import pygame as pg
+import pytest
+
+from pypixelart.sidecar_cache import SidecarCache
+
+
+def rgba(image: pg.Surface) -> bytes:
+    return pg.image.tostring(image, "RGBA")
+
+
+@pytest.fixture
+def image() -> pg.Surface:
+    image = pg.Surface((30, 20), pg.SRCALPHA)
+    image.fill((10, 20, 30, 40), (5, 5, 10, 10))
+    return image
+
+
+def test_round_trip(tmp_path, image):
+    cache = SidecarCache(tmp_path / "image.png")
+    cache.write_rects(image, [image.get_rect()])
+    image.fill((255, 0, 0, 255), (20, 15, 3, 2))
+    cache.write_rects(image, [pg.Rect(20, 15, 3, 2), pg.Rect(-5, -5, 2, 2)])
+    cache.close()
+
+    assert rgba(SidecarCache(tmp_path / "image.png").load()) == rgba(image)
+
+
+def test_no_sidecar(tmp_path):
+    assert SidecarCache(tmp_path / "image.png").load() is None
+
+
+def test_close_can_delete_the_sidecar(tmp_path, image):
+    cache = SidecarCache(tmp_path / "image.png")
+    cache.open(image)
+    cache.close(delete=True)
+
+    assert not cache.path.exists()
+
+
+def test_sidecar_of_a_changed_image_is_ignored(tmp_path, image):
+    image_path = tmp_path / "image.png"
+    pg.image.save(image, image_path)
+    cache = SidecarCache(image_path)
+    cache.open(image)
+    cache.close()
+    assert SidecarCache(image_path).load() is not None
+
+    stat = image_path.stat()
+    os.utime(image_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert SidecarCache(image_path).load() is None
+
+
+def test_sidecar_of_an_image_saved_later_is_ignored(tmp_path, image):
+    image_path = tmp_path / "image.png"
+    cache = SidecarCache(image_path)
+    cache.open(image)
+    cache.close()
+    pg.image.save(image, image_path)
+
+    assert SidecarCache(image_path).load() is None
+
+
+def test_truncated_sidecar_is_ignored(tmp_path, image):
+    cache = SidecarCache(tmp_path / "image.png")
+    cache.open(image)
+    cache.close()
+    cache.path.write_bytes(cache.path.read_bytes()[:-1])
+
+    assert SidecarCache(tmp_path / "image.png").load() is None